@@ -1,57 +1,167 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
-import sqlite3
 import asyncio
 from datetime import datetime
 import pytz
 import chat_exporter
+import hashlib
 import io
+import json
+import sqlite3
+import time
+from channel_pool import TicketChannelPool
+from database import Database
+from guild_config import CONFIG_KEYS, DEFAULT_CONFIG, GuildConfigCache
+from guild_index import GuildIndexes
+from members import MemberResolver
+from metrics import LoopLagMonitor, MetricsRegistry, http_trace
+from panels import PanelResetDebouncer
+from renames import RenameScheduler
+from roles import reconcile_roles
+from timing import StepTimer, resident_memory_mb
+from tracing import Tracer, current_span, trace_requests
+from transcript_render import ProcessTranscriptRenderer
+from transcripts import TranscriptArchive, TranscriptJob, TranscriptPipeline
+from fees import FEE_PER_DEAL, WARN_PENALTY, compact_fees, fee_balance, fee_statement, record_fee
+from migrations import claim_legacy_rows, migrate, rebuild_user_totals
+from rates import RatesCache
+from search import index_trade, search
+from tickets import ActiveTicket, ActiveTicketRegistry
+STARTED_AT = time.perf_counter()
+# Optional lazy mode: skip downloading every guild's member list at login.
+# Members resolved through `members` then live only in its bounded LRU, and
+# reconcile_roles re-fetches them before replacing their roles.
+LAZY_MEMBER_CHUNKING = False
+METRICS_PORT = 9100
+# Interactions slower than this are written with their span tree to slow_interactions.jsonl;
+# lower TRACE_SAMPLE_RATE to trace only that fraction of interactions.
+SLOW_INTERACTION_MS = 3000
+TRACE_SAMPLE_RATE = 1.0
+metrics = MetricsRegistry()
+tracer = Tracer(threshold_ms=SLOW_INTERACTION_MS, sample_rate=TRACE_SAMPLE_RATE)
+command_latency = metrics.histogram('command_seconds', 'Time spent handling a command', ('command', 'kind', 'status'))
+
+def observe_app_command(interaction, status):
+    started = interaction.extras.get('started')
+    if started is not None and interaction.command is not None:
+        command_latency.observe(time.perf_counter() - started, command=interaction.command.qualified_name, kind='slash', status=status)
+
+def interaction_attrs(interaction):
+    return {'interaction_id': interaction.id, 'user_id': interaction.user.id, 'guild_id': interaction.guild_id,
+            'channel_id': interaction.channel_id}
+
+class InstrumentedCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction):
+        interaction.extras['started'] = time.perf_counter()
+        name = interaction.command.qualified_name if interaction.command else interaction.data.get('name')
+        tracer.begin(f'/{name}', kind=interaction.type.name, **interaction_attrs(interaction))
+        return True
+    
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        observe_app_command(interaction, 'error')
+        current_span().set(error=repr(error))
+        await super().on_error(interaction, error)
+
+class TracedInteraction:
+    """Mixed into every View, Modal and DynamicItem so each click or submit gets its own trace."""
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        tracer.begin(self.trace_name(interaction), kind=interaction.type.name, **interaction_attrs(interaction))
+        return await super().interaction_check(interaction)
+
+    async def on_error(self, interaction: discord.Interaction, error: Exception, *args):
+        current_span().set(error=repr(error))
+        await super().on_error(interaction, error, *args)
+
+    def trace_name(self, interaction):
+        owner = type(self).__name__
+        if isinstance(self, discord.ui.Modal):
+            return f'{owner}.on_submit'
+        if isinstance(self, discord.ui.DynamicItem):
+            return f'{owner}.callback'
+        custom_id = interaction.data.get('custom_id')
+        for item in self.children:
+            if getattr(item, 'custom_id', None) == custom_id:
+                # Decorated buttons wrap the method; subclassed items (ExchangeTypeSelect) are named by class.
+                callback = getattr(item.callback, 'callback', None)
+                return f'{owner}.{callback.__name__ if callback else type(item).__name__}'
+        return owner
+
+class ExchangeBot(commands.AutoShardedBot):
+    async def close(self):
+        # Stop taking transcript jobs first, then let queued writes commit and
+        # the render pool and slow-log listener finish before the process exits.
+        await transcript_pipeline.stop()
+        await super().close()
+        await db.close()
+        transcript_renderer.close()
+        tracer.stop()
+
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
-bot = commands.Bot(command_prefix=".", intents=intents)
+# Rate limits longer than this raise discord.RateLimited instead of being slept through,
+# so the rename scheduler can requeue a blocked rename rather than wait inside channel.edit.
+MAX_RATELIMIT_WAIT = 60.0
+bot_options = {'tree_cls': InstrumentedCommandTree, 'http_trace': trace_requests(http_trace(metrics)),
+               'max_ratelimit_timeout': MAX_RATELIMIT_WAIT}
+if LAZY_MEMBER_CHUNKING:
+    bot_options.update(chunk_guilds_at_startup=False)
+bot = ExchangeBot(command_prefix=".", intents=intents, **bot_options)
+loop_lag = LoopLagMonitor(metrics)
+startup_report = {}
+db = Database('exchangers.db')
+guild_configs = GuildConfigCache(db)
+rates_cache = RatesCache(db)
+active_tickets = ActiveTicketRegistry(db)
+guild_indexes = GuildIndexes()
+members = MemberResolver(cache_members=not LAZY_MEMBER_CHUNKING)
+renames = RenameScheduler()
+panel_resets = PanelResetDebouncer(delay=3.0)
+channel_pool = TicketChannelPool(watermark=2, quiet=60)
+# 'inline' uses chat_exporter on the event loop; 'process' builds a simplified transcript
+# (no markdown, mention names, replies or reactions) in worker processes instead.
+TRANSCRIPT_RENDER_MODE = 'inline'
+transcript_renderer = ProcessTranscriptRenderer(workers=2, timeout=120)
+EXCHANGER_ROLE_NAMES = {
+    'I2C': '# I2C Exchanger',
+    'C2I': '# C2I Exchanger',
+    'N2C': '# N2C Exchanger',
+    'C2N': '# C2N Exchanger'
+}
+TICKET_CATEGORY_KEYS = {
+    'I2C': 'i2c_category',
+    'C2I': 'c2i_category',
+    'N2C': 'n2c_category',
+    'C2N': 'c2n_category'
+}
+CLIENT_ROLE_NAMES = {
+    'I2C': '# I2C',
+    'C2I': '# C2I',
+    'N2C': '# N2C',
+    'C2N': '# C2N'
+}
 def init_db():
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS exchangers
-                 (user_id INTEGER PRIMARY KEY, security_holding REAL, exchanger_type TEXT, joined_date TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS rates
-                 (type TEXT PRIMARY KEY, rate REAL)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS trades
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                  exchanger_id INTEGER, 
-                  client_id INTEGER, 
-                  exchange_type TEXT, 
-                  amount_usd REAL, 
-                  crypto TEXT,
-                  date TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS active_tickets
-                 (channel_id INTEGER PRIMARY KEY,
-                  client_id INTEGER,
-                  exchanger_id INTEGER,
-                  exchange_type TEXT,
-                  claim_time TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS fees
-                 (user_id INTEGER PRIMARY KEY,
-                  total_fee REAL DEFAULT 0)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS warnings
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  reason TEXT,
-                  warned_by INTEGER,
-                  date TEXT)''')
-    
-    try:
-        c.execute('SELECT claim_time FROM active_tickets LIMIT 1')
-    except sqlite3.OperationalError:
-        c.execute('ALTER TABLE active_tickets ADD COLUMN claim_time TEXT')
-    
-    for ex_type in ['I2C', 'C2I', 'N2C', 'C2N']:
-        c.execute('INSERT OR IGNORE INTO rates VALUES (?, ?)', (ex_type, 1.0))
-    conn.commit()
-    conn.close()
-init_db()
+    version = migrate(db.connect())
+    print(f'Database schema at version {version}')
+    guild_configs.hydrate(db.connect())
+    rates_cache.hydrate(db.connect())
+    active_tickets.hydrate(db.connect())
+
+def config_role(guild, key):
+    role_id = guild_configs.get(guild.id, key)
+    return guild.get_role(role_id) if role_id else None
+
+def config_channel(guild, key):
+    channel_id = guild_configs.get(guild.id, key)
+    channel = guild.get_channel(channel_id) if channel_id else None
+    # Rows edited outside /setconfig may point at a category or voice channel; treat those as unset.
+    return channel if isinstance(channel, discord.TextChannel) else None
+
+def ticket_category(guild, exchange_type):
+    category_id = guild_configs.get(guild.id, TICKET_CATEGORY_KEYS[exchange_type])
+    return guild_indexes.category(guild, category_id) if category_id else None
 
 class ExchangeTypeSelect(discord.ui.Select):
     def __init__(self):
@@ -68,27 +178,215 @@ class ExchangeTypeSelect(discord.ui.Select):
         modal = AmountModal(exchange_type)
         await interaction.response.send_modal(modal)
         
-        await asyncio.sleep(3)
-        
         for option in self.options:
             option.default = False
         
-        await interaction.message.edit(view=self.view)
+        panel_resets.request(interaction.message, self.view)
 
-class ExchangePanelView(discord.ui.View):
+class ExchangePanelView(TracedInteraction, discord.ui.View):
     def __init__(self):
         super().__init__(timeout=None)
         self.add_item(ExchangeTypeSelect())
 
 @bot.event
-async def on_ready():
-    print(f'{bot.user} is ready!')
+async def setup_hook():
+    bot.add_dynamic_items(VouchButton, FeedbackButton)
+    db.start_writer()
+    renames.start()
+    if TRANSCRIPT_RENDER_MODE == 'process':
+        transcript_renderer.start()
+    transcript_pipeline.start()
+    compact_fee_ledger.start()
+    refill_channel_pool.start()
     bot.add_view(ExchangePanelView())
+    loop_lag.start()
+    tracer.start()
+    try:
+        await metrics.serve(port=METRICS_PORT)
+    except OSError as e:
+        print(f'Could not start metrics endpoint: {e}')
     try:
-        synced = await bot.tree.sync()
-        print(f'Synced {len(synced)} commands')
+        await sync_command_tree()
     except Exception as e:
         print(f'Error syncing: {e}')
+
+def command_tree_hash():
+    # to_dict covers names, descriptions, parameters and choices, i.e. exactly what sync uploads.
+    payload = sorted((command.to_dict(bot.tree) for command in bot.tree.get_commands()), key=lambda command: command['name'])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+async def sync_command_tree(force=False):
+    tree_hash = command_tree_hash()
+    row = await db.fetchone("SELECT value FROM meta WHERE key = 'command_tree_hash'")
+    if not force and row and row[0] == tree_hash:
+        print('Command tree unchanged, skipping sync')
+        return None
+    synced = await bot.tree.sync()
+    await db.execute("INSERT INTO meta (key, value) VALUES ('command_tree_hash', ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                     (tree_hash,))
+    print(f'Synced {len(synced)} commands')
+    return synced
+
+@tasks.loop(minutes=10)
+async def compact_fee_ledger():
+    await db.write(compact_fees)
+
+@tasks.loop(seconds=30)
+async def refill_channel_pool():
+    for guild in bot.guilds:
+        for exchange_type in TICKET_CATEGORY_KEYS:
+            # Channel creation shares its rate limit with tickets opened on a pool miss.
+            if not channel_pool.is_quiet():
+                return
+            category = ticket_category(guild, exchange_type)
+            if not category:
+                continue
+            try:
+                await channel_pool.refill(category, exchange_type)
+            except discord.HTTPException as e:
+                print(f'Failed to refill ticket pool for {exchange_type}: {e}')
+
+@refill_channel_pool.before_loop
+async def before_refill_channel_pool():
+    await bot.wait_until_ready()
+
+@bot.event
+async def on_ready():
+    print(f'{bot.user} is ready!')
+    if not startup_report:
+        startup_report.update(
+            mode='lazy' if LAZY_MEMBER_CHUNKING else 'chunked',
+            ready_seconds=time.perf_counter() - STARTED_AT,
+            memory_mb=resident_memory_mb(),
+            cached_members=sum(len(guild.members) for guild in bot.guilds)
+        )
+        print(f"Ready in {startup_report['ready_seconds']:.1f}s with {startup_report['mode']} member chunking "
+              f"({startup_report['memory_mb']:.0f} MB resident, {startup_report['cached_members']} members cached)")
+        await claim_legacy_guild()
+    for guild in bot.guilds:
+        guild_indexes.build(guild)
+        for exchange_type in TICKET_CATEGORY_KEYS:
+            category = ticket_category(guild, exchange_type)
+            if category:
+                channel_pool.adopt(category, lambda channel: active_tickets.by_channel(channel.id) is None)
+
+async def claim_legacy_guild():
+    # Data from before per-guild scoping belongs to the server that owns the original admin role.
+    if await db.fetchone("SELECT value FROM meta WHERE key = 'legacy_guild_id'"):
+        return
+    guild = next((guild for guild in bot.guilds if guild.get_role(DEFAULT_CONFIG['admin_role'])), None)
+    if not guild:
+        return
+    claimed = await db.write(lambda c: claim_legacy_rows(c, guild.id, DEFAULT_CONFIG), label='claim legacy rows')
+    
+    # Rows are read on the database thread but swapped in here on the event loop,
+    # so a claim or modal never sees a cache halfway through being rebuilt.
+    caches = (guild_configs, rates_cache, active_tickets)
+    loaded = await db.run('rehydrate', lambda conn: [cache.load(conn) for cache in caches])
+    for cache, rows in zip(caches, loaded):
+        cache.replace(rows)
+    print(f'Assigned {claimed} existing rows to {guild.name} ({guild.id})')
+
+@bot.listen('on_interaction')
+async def remember_interaction_member(interaction):
+    # Interaction payloads carry the full member, so they fill the cache for free.
+    if isinstance(interaction.user, discord.Member):
+        members.remember(interaction.user)
+
+@bot.before_invoke
+async def remember_command_author(ctx):
+    ctx.started = time.perf_counter()
+    tracer.begin(f'.{ctx.command.qualified_name}', kind='prefix', message_id=ctx.message.id, user_id=ctx.author.id,
+                 guild_id=ctx.guild.id if ctx.guild else None, channel_id=ctx.channel.id)
+    if isinstance(ctx.author, discord.Member):
+        members.remember(ctx.author)
+
+@bot.after_invoke
+async def record_prefix_command(ctx):
+    if ctx.command_failed:
+        current_span().set(status='error')
+    command_latency.observe(time.perf_counter() - ctx.started, command=ctx.command.qualified_name, kind='prefix',
+                            status='error' if ctx.command_failed else 'ok')
+
+@bot.listen('on_app_command_completion')
+async def record_app_command(interaction, command):
+    observe_app_command(interaction, 'ok')
+
+active_ticket_gauge = metrics.gauge('active_tickets', 'Open tickets by exchange type and claim state', ('exchange_type', 'state'))
+db_query_count = metrics.counter('db_queries_total', 'Database operations by label', ('label',))
+db_query_seconds = metrics.counter('db_query_seconds_total', 'Time database operations spent queued (wait) and running (exec)', ('label', 'phase'))
+db_query_max = metrics.gauge('db_query_max_seconds', 'Slowest single database operation by label', ('label', 'phase'))
+queue_depth = metrics.gauge('queue_depth', 'Work waiting in background queues', ('queue',))
+pooled_channels = metrics.gauge('pooled_channels', 'Pre-created ticket channels ready to hand out', ('exchange_type',))
+panel_edits_saved = metrics.counter('panel_edits_saved_total', 'Panel reset edits avoided by debouncing')
+traced_interactions = metrics.counter('traced_interactions_total', 'Interactions and prefix commands traced (after sampling)')
+slow_interactions = metrics.counter('slow_interactions_total', 'Traced interactions written to the slow interaction log')
+
+@metrics.collector
+def collect_bot_state():
+    active_ticket_gauge.clear()
+    counts = {}
+    for ticket in active_tickets:
+        key = (ticket.exchange_type or 'unknown', 'claimed' if ticket.exchanger_id else 'open')
+        counts[key] = counts.get(key, 0) + 1
+    for (exchange_type, state), count in counts.items():
+        active_ticket_gauge.set(count, exchange_type=exchange_type, state=state)
+    for label, stats in list(db.stats.items()):
+        db_query_count.set(stats.count, label=label)
+        db_query_seconds.set(stats.wait_total, label=label, phase='wait')
+        db_query_seconds.set(stats.exec_total, label=label, phase='exec')
+        db_query_max.set(stats.wait_max, label=label, phase='wait')
+        db_query_max.set(stats.exec_max, label=label, phase='exec')
+    queue_depth.set(transcript_pipeline.backlog(), queue='transcripts')
+    queue_depth.set(renames.pending_count(), queue='renames')
+    queue_depth.set(panel_resets.pending_count(), queue='panel_resets')
+    for exchange_type, key in TICKET_CATEGORY_KEYS.items():
+        pooled_channels.set(sum(channel_pool.available(guild_configs.get(guild.id, key)) for guild in bot.guilds),
+                            exchange_type=exchange_type)
+    panel_edits_saved.set(panel_resets.edits_saved)
+    traced_interactions.set(tracer.traced)
+    slow_interactions.set(tracer.slow)
+
+@bot.event
+async def on_guild_join(guild):
+    guild_indexes.build(guild)
+
+@bot.event
+async def on_guild_remove(guild):
+    guild_indexes.forget(guild)
+
+@bot.event
+async def on_raw_member_remove(payload):
+    # Raw so it also fires for members only the resolver's TTL cache knew about (lazy mode).
+    members.forget(payload.guild_id, payload.user.id)
+
+@bot.event
+async def on_guild_role_create(role):
+    guild_indexes.roles_changed(role.guild)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    guild_indexes.roles_changed(after.guild)
+
+@bot.event
+async def on_guild_role_delete(role):
+    guild_indexes.roles_changed(role.guild)
+
+@bot.event
+async def on_guild_channel_create(channel):
+    guild_indexes.channels_changed(channel)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    guild_indexes.channels_changed(after)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    guild_indexes.channels_changed(channel)
+    renames.cancel(channel.id)
+    channel_pool.discard(channel)
+    if active_tickets.by_channel(channel.id):
+        await active_tickets.remove(channel.id)
 @bot.tree.command(name="create", description="Create a new exchanger")
 @app_commands.describe(
     user="The user to add as exchanger", 
@@ -107,7 +405,7 @@ async def create_exchanger(
     n2c: bool = False,
     c2n: bool = False
 ):
-    required_role = interaction.guild.get_role(1443936237349240872)
+    required_role = config_role(interaction.guild, 'admin_role')
     if not required_role or required_role not in interaction.user.roles:
         await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
         return
@@ -128,31 +426,16 @@ async def create_exchanger(
         await interaction.followup.send("❌ Please select at least one exchanger type!", ephemeral=True)
         return
     
-    role_names = {
-        'I2C': '# I2C Exchanger',
-        'C2I': '# C2I Exchanger',
-        'N2C': '# N2C Exchanger',
-        'C2N': '# C2N Exchanger'
-    }
-    
-    default_role = interaction.guild.get_role(1443936662018068500)
-    if default_role:
-        await user.add_roles(default_role)
-    
-    for exchanger_type in types_list:
-        role = discord.utils.get(interaction.guild.roles, name=role_names[exchanger_type])
-        if role:
-            await user.add_roles(role)
+    new_roles = [config_role(interaction.guild, 'exchanger_role')]
+    new_roles += [guild_indexes.role(interaction.guild, EXCHANGER_ROLE_NAMES[exchanger_type]) for exchanger_type in types_list]
+    await reconcile_roles(user, add=new_roles)
     
     ist = pytz.timezone('Asia/Kolkata')
     joined_date = datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S')
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
     exchanger_type_str = ','.join(types_list)
-    c.execute('INSERT OR REPLACE INTO exchangers VALUES (?, ?, ?, ?)', (user.id, security_holding, exchanger_type_str, joined_date))
-    conn.commit()
-    conn.close()
+    await db.execute('INSERT OR REPLACE INTO exchangers (guild_id, user_id, security_holding, exchanger_type, joined_date) VALUES (?, ?, ?, ?, ?)',
+                     (interaction.guild.id, user.id, security_holding, exchanger_type_str, joined_date))
     
     await interaction.followup.send(f"✅ {user.mention} added as {exchanger_type_str} exchanger with ${security_holding} security holding", ephemeral=True)
 @bot.tree.command(name="update", description="Update an exchanger")
@@ -173,7 +456,7 @@ async def update_exchanger(
     n2c: bool = False,
     c2n: bool = False
 ):
-    required_role = interaction.guild.get_role(1443936237349240872)
+    required_role = config_role(interaction.guild, 'admin_role')
     if not required_role or required_role not in interaction.user.roles:
         await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
         return
@@ -194,77 +477,36 @@ async def update_exchanger(
         await interaction.followup.send("❌ Please select at least one exchanger type!", ephemeral=True)
         return
     
-    role_names = {
-        'I2C': '# I2C Exchanger',
-        'C2I': '# C2I Exchanger',
-        'N2C': '# N2C Exchanger',
-        'C2N': '# C2N Exchanger'
-    }
-    
-    all_exchanger_roles = [discord.utils.get(interaction.guild.roles, name=name) for name in role_names.values()]
-    for role in all_exchanger_roles:
-        if role and role in user.roles:
-            await user.remove_roles(role)
+    all_exchanger_roles = [guild_indexes.role(interaction.guild, name) for name in EXCHANGER_ROLE_NAMES.values()]
+    new_roles = [guild_indexes.role(interaction.guild, EXCHANGER_ROLE_NAMES[exchanger_type]) for exchanger_type in types_list]
+    await reconcile_roles(user, add=new_roles, remove=all_exchanger_roles)
     
-    for exchanger_type in types_list:
-        role = discord.utils.get(interaction.guild.roles, name=role_names[exchanger_type])
-        if role:
-            await user.add_roles(role)
-    
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
     exchanger_type_str = ','.join(types_list)
-    c.execute('UPDATE exchangers SET security_holding = ?, exchanger_type = ? WHERE user_id = ?', 
-              (security_holding, exchanger_type_str, user.id))
-    conn.commit()
-    conn.close()
+    await db.execute('UPDATE exchangers SET security_holding = ?, exchanger_type = ? WHERE guild_id = ? AND user_id = ?', 
+                     (security_holding, exchanger_type_str, interaction.guild.id, user.id))
     
     await interaction.followup.send(f"✅ Updated {user.mention}: ${security_holding} - {exchanger_type_str}", ephemeral=True)
 @bot.tree.command(name="setrates", description="Set exchange rates")
 @app_commands.describe(c2i="C2I rate", i2c="I2C rate", n2c="N2C rate", c2n="C2N rate")
 async def set_rates(interaction: discord.Interaction, c2i: float = None, i2c: float = None, n2c: float = None, c2n: float = None):
-    required_role = interaction.guild.get_role(1443936237349240872)
+    required_role = config_role(interaction.guild, 'admin_role')
     if not required_role or required_role not in interaction.user.roles:
         await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
         return
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    updates = []
-    if c2i is not None:
-        c.execute('UPDATE rates SET rate = ? WHERE type = ?', (c2i, 'C2I'))
-        updates.append(f"C2I = {c2i}")
-    if i2c is not None:
-        c.execute('UPDATE rates SET rate = ? WHERE type = ?', (i2c, 'I2C'))
-        updates.append(f"I2C = {i2c}")
-    if n2c is not None:
-        c.execute('UPDATE rates SET rate = ? WHERE type = ?', (n2c, 'N2C'))
-        updates.append(f"N2C = {n2c}")
-    if c2n is not None:
-        c.execute('UPDATE rates SET rate = ? WHERE type = ?', (c2n, 'C2N'))
-        updates.append(f"C2N = {c2n}")
-    conn.commit()
-    conn.close()
+    changed = await rates_cache.update(interaction.guild.id, {'C2I': c2i, 'I2C': i2c, 'N2C': n2c, 'C2N': c2n})
+    updates = [f"{ex_type} = {rate}" for rate, ex_type in changed]
     await interaction.response.send_message(f"✅ Rates updated: {', '.join(updates)}", ephemeral=True)
 @bot.tree.command(name="rates", description="Display all exchange rates")
 async def show_rates(interaction: discord.Interaction):
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT type, rate FROM rates')
-    rates_data = {row[0]: row[1] for row in c.fetchall()}
-    conn.close()
-    
     embed = discord.Embed(
         title="<:thumb:1444212018147233943> Exchange Rates",
         description="Current exchange rates for all types",
         color=discord.Color.blue()
     )
     
-    inr_rates = f"> **I2C:** {rates_data.get('I2C', 'N/A')}/$\n> **C2I:** {rates_data.get('C2I', 'N/A')}/$"
-    npr_rates = f"> **N2C:** {rates_data.get('N2C', 'N/A')}/$\n> **C2N:** {rates_data.get('C2N', 'N/A')}/$"
-    
-    embed.add_field(name="<:inrswap:1444194680244797491> INR Rates", value=inr_rates, inline=False)
-    embed.add_field(name="<:cryptoo:1444194918166958120> NPR Rates", value=npr_rates, inline=False)
+    embed.add_field(name="<:inrswap:1444194680244797491> INR Rates", value=rates_cache.inr_rates(interaction.guild.id), inline=False)
+    embed.add_field(name="<:cryptoo:1444194918166958120> NPR Rates", value=rates_cache.npr_rates(interaction.guild.id), inline=False)
     embed.set_thumbnail(url=interaction.guild.icon.url if interaction.guild.icon else None)
     
     await interaction.response.send_message(embed=embed)
@@ -300,18 +542,12 @@ async def calc(ctx, *, expression: str):
     app_commands.Choice(name="C2N (Crypto to NPR)", value="C2N")
 ])
 async def convert(interaction: discord.Interaction, exchange_type: str, amount: float):
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT rate FROM rates WHERE type = ?', (exchange_type,))
-    rate_result = c.fetchone()
-    conn.close()
+    rate = rates_cache.get(interaction.guild.id, exchange_type)
     
-    if not rate_result:
+    if rate is None:
         await interaction.response.send_message("❌ Rate not found!", ephemeral=True)
         return
     
-    rate = rate_result[0]
-    
     if exchange_type == "I2C":
         converted = amount / rate
         result = f"₹{amount:.2f} INR = ${converted:.2f} USD (Rate: {rate})"
@@ -327,7 +563,7 @@ async def convert(interaction: discord.Interaction, exchange_type: str, amount:
     
     await interaction.response.send_message(result)
 
-class AmountModal(discord.ui.Modal):
+class AmountModal(TracedInteraction, discord.ui.Modal):
     def __init__(self, exchange_type: str):
         super().__init__(title=f"{exchange_type} Exchange")
         self.exchange_type = exchange_type
@@ -357,20 +593,11 @@ class AmountModal(discord.ui.Modal):
             return
         crypto = self.crypto_input.value
         
-        conn = sqlite3.connect('exchangers.db')
-        c = conn.cursor()
-        
-        c.execute('SELECT channel_id FROM active_tickets WHERE client_id = ?', (interaction.user.id,))
-        existing_ticket = c.fetchone()
-        if existing_ticket:
+        if active_tickets.by_client(interaction.guild.id, interaction.user.id):
             await interaction.response.send_message("❌ You already have an active ticket! Please complete or close it first.", ephemeral=True)
-            conn.close()
             return
         
-        c.execute('SELECT rate FROM rates WHERE type = ?', (self.exchange_type,))
-        rate_result = c.fetchone()
-        conn.close()
-        rate = rate_result[0] if rate_result else 1.0
+        rate = rates_cache.get(interaction.guild.id, self.exchange_type, 1.0)
         if self.exchange_type == "I2C":
             amount_inr = amount
             amount_usd = amount / rate
@@ -397,41 +624,33 @@ class AmountModal(discord.ui.Modal):
         if amount_npr is not None:
             embed.add_field(name="Amount in NPR", value=f"रू{amount_npr:.2f}", inline=True)
         embed.add_field(name="Rules", value="1. Follow server guidelines\n2. Be respectful\n3. Provide accurate information\n4. Wait for exchanger response", inline=False)
-        view = ConfirmView(self.exchange_type, amount_usd, amount_inr if amount_inr else amount_npr, interaction.user, crypto)
+        view = ConfirmView(self.exchange_type, amount_usd, amount_inr if amount_inr else amount_npr, interaction.user, crypto, rate)
         await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
-class ConfirmView(discord.ui.View):
-    def __init__(self, exchange_type: str, amount_usd: float, amount_local: float, user: discord.Member, crypto: str):
+class ConfirmView(TracedInteraction, discord.ui.View):
+    def __init__(self, exchange_type: str, amount_usd: float, amount_local: float, user: discord.Member, crypto: str, rate: float):
         super().__init__(timeout=300)
         self.exchange_type = exchange_type
         self.amount_usd = amount_usd
         self.amount_local = amount_local
         self.user = user
         self.crypto = crypto
+        self.rate = rate
     @discord.ui.button(label="Confirm", style=discord.ButtonStyle.green, emoji="✅")
     async def confirm_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         for item in self.children:
             item.disabled = True
+        if active_tickets.by_client(interaction.guild.id, self.user.id):
+            await interaction.response.edit_message(content="❌ You already have an active ticket! Please complete or close it first.", embed=None, view=None)
+            return
         await interaction.response.edit_message(view=self)
         
         guild = interaction.guild
         
-        category_ids = {
-            'I2C': 1444172151237378088,
-            'C2I': 1444172197164748851,
-            'N2C': 1444172222846603346,
-            'C2N': 1444172246255145111
-        }
-        category = guild.get_channel(category_ids[self.exchange_type])
+        category = ticket_category(guild, self.exchange_type)
         
         ticket_name = f"uc-{self.exchange_type.lower()}-{self.user.name}"
-        role_names = {
-            'I2C': '# I2C Exchanger',
-            'C2I': '# C2I Exchanger',
-            'N2C': '# N2C Exchanger',
-            'C2N': '# C2N Exchanger'
-        }
-        exchanger_role = discord.utils.get(guild.roles, name=role_names[self.exchange_type])
-        staff_role = guild.get_role(1443936660063518770)
+        exchanger_role = guild_indexes.role(guild, EXCHANGER_ROLE_NAMES[self.exchange_type])
+        staff_role = config_role(guild, 'staff_role')
         overwrites = {
             guild.default_role: discord.PermissionOverwrite(read_messages=False),
             self.user: discord.PermissionOverwrite(read_messages=True, send_messages=True),
@@ -440,18 +659,23 @@ class ConfirmView(discord.ui.View):
             overwrites[exchanger_role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
         if staff_role:
             overwrites[staff_role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-        ticket_channel = await guild.create_text_channel(
-            name=ticket_name,
-            category=category,
-            overwrites=overwrites
-        )
+        ticket_channel = await channel_pool.take(category, ticket_name, overwrites) if category else None
+        if ticket_channel:
+            renames.record(ticket_channel.id)
+        else:
+            ticket_channel = await guild.create_text_channel(
+                name=ticket_name,
+                category=category,
+                overwrites=overwrites
+            )
         
-        conn = sqlite3.connect('exchangers.db')
-        c = conn.cursor()
-        c.execute('INSERT INTO active_tickets (channel_id, client_id, exchanger_id, exchange_type, claim_time) VALUES (?, ?, ?, ?, ?)',
-                  (ticket_channel.id, self.user.id, None, self.exchange_type, None))
-        conn.commit()
-        conn.close()
+        try:
+            await active_tickets.create(ActiveTicket(ticket_channel.id, self.user.id, exchange_type=self.exchange_type, amount_usd=self.amount_usd,
+                                                     amount_local=self.amount_local, crypto=self.crypto, rate=self.rate, guild_id=guild.id))
+        except sqlite3.IntegrityError:
+            await ticket_channel.delete()
+            await interaction.edit_original_response(content="❌ You already have an active ticket! Please complete or close it first.", embed=None, view=None)
+            return
         
         embed = discord.Embed(title="<:cryptoswap:1425071000139202620> New Exchange Ticket", color=discord.Color.green())
         embed.add_field(name="User", value=self.user.mention, inline=False)
@@ -475,29 +699,21 @@ class ConfirmView(discord.ui.View):
         await interaction.response.edit_message(content="❌ Ticket creation cancelled", view=self)
 @bot.tree.command(name="expanel", description="Send the exchange panel")
 async def panel(interaction: discord.Interaction):
-    required_role = interaction.guild.get_role(1443936237349240872)
+    required_role = config_role(interaction.guild, 'admin_role')
     if not required_role or required_role not in interaction.user.roles:
         await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
         return
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT type, rate FROM rates')
-    rates = {row[0]: row[1] for row in c.fetchall()}
-    conn.close()
-    
     embed = discord.Embed(
         title="<:cryptoswap:1425071000139202620> Exchange Panel",
         description="Select an exchange type below to create a ticket",
         color=discord.Color.blue()
     )
     
-    inr_rates = f"> **I2C:** {rates.get('I2C', 'N/A')}/$\n> **C2I:** {rates.get('C2I', 'N/A')}/$"
-    npr_rates = f"> **N2C:** {rates.get('N2C', 'N/A')}/$\n> **C2N:** {rates.get('C2N', 'N/A')}/$"
     tos_details = f"> 1. Fixed Rates – No Negotiations. \n> 2. Always Follow Staff Instructions. \n> 3. Be Patient & Avoid Unnecessary Pings. \n> 4. Read TOS before proceeding."
     
-    embed.add_field(name="<:inrswap:1444194680244797491> INR Rates", value=inr_rates, inline=False)
-    embed.add_field(name="<:cryptoo:1444194918166958120> NPR Rates", value=npr_rates, inline=False)
+    embed.add_field(name="<:inrswap:1444194680244797491> INR Rates", value=rates_cache.inr_rates(interaction.guild.id), inline=False)
+    embed.add_field(name="<:cryptoo:1444194918166958120> NPR Rates", value=rates_cache.npr_rates(interaction.guild.id), inline=False)
     embed.add_field(name="<:rules:1444204795085983775> TOS", value=tos_details, inline=False)
     embed.set_thumbnail(url=interaction.guild.icon.url if interaction.guild.icon else None)
      
@@ -506,112 +722,122 @@ async def panel(interaction: discord.Interaction):
     await interaction.channel.send(embed=embed, view=view)
 @bot.command(name="claim")
 async def claim_ticket(ctx):
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT security_holding, exchanger_type FROM exchangers WHERE user_id = ?', (ctx.author.id,))
-    result = c.fetchone()
+    result = await db.fetchone('SELECT security_holding, exchanger_type FROM exchangers WHERE guild_id = ? AND user_id = ?', (ctx.guild.id, ctx.author.id))
     
     if not result:
         await ctx.send("❌ You are not registered as an exchanger!")
-        conn.close()
         return
     
     security_holding, exchanger_types_str = result
     exchanger_types = [t.strip() for t in exchanger_types_str.split(',')]
     
-    channel_name = ctx.channel.name
-    if not channel_name.startswith("uc-"):
+    ticket = active_tickets.by_channel(ctx.channel.id)
+    if not ticket:
         await ctx.send("❌ This is not a ticket channel!")
-        conn.close()
         return
     
-    c.execute('SELECT exchanger_id FROM active_tickets WHERE channel_id = ?', (ctx.channel.id,))
-    ticket_data = c.fetchone()
-    
-    if ticket_data and ticket_data[0]:
-        if ticket_data[0] == ctx.author.id:
+    if ticket.exchanger_id:
+        if ticket.exchanger_id == ctx.author.id:
             await ctx.send("❌ You have already claimed this ticket! Please complete it first.")
         else:
             await ctx.send("❌ This ticket has already been claimed by another exchanger!")
-        conn.close()
         return
     
-    parts = channel_name.split('-')
-    if len(parts) < 3:
-        await ctx.send("❌ Invalid ticket channel format!")
-        conn.close()
-        return
-    
-    ticket_type = parts[1].upper()
+    ticket_type = ticket.exchange_type
     
     if ticket_type not in exchanger_types:
         await ctx.send(f"❌ You can only claim {', '.join(exchanger_types)} tickets! This is a {ticket_type} ticket.")
-        conn.close()
         return
     
-    c.execute('SELECT channel_id FROM active_tickets WHERE exchanger_id = ?', (ctx.author.id,))
-    existing_claim = c.fetchone()
+    if active_tickets.by_exchanger(ctx.guild.id, ctx.author.id):
+        await ctx.send("❌ You already have an active claimed ticket! Please complete it first.")
+        return
     
-    if existing_claim:
+    ticket_amount = ticket.amount_usd
+    if ticket_amount is None:
+        legacy_details = await parse_legacy_ticket(ctx.channel)
+        if not legacy_details or 'amount_usd' not in legacy_details:
+            await ctx.send("❌ Could not find ticket information!")
+            return
+        ticket_amount = legacy_details['amount_usd']
+        if ticket_amount is None:
+            await ctx.send("❌ Could not parse ticket amount!")
+            return
+    
+    if ticket_amount > security_holding / 2:
+        await ctx.send(f"❌ Ticket Amount Exceed your limit.\nYour limit: ${security_holding / 2:.2f}\nTicket amount: ${ticket_amount:.2f}")
+        return
+    
+    new_name = f"c-{ticket_base_name(ctx.channel, ticket)}-{ctx.author.name}"
+    
+    ist = pytz.timezone('Asia/Kolkata')
+    claim_time = datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S')
+    
+    try:
+        claimed = await active_tickets.claim(ctx.channel.id, ctx.author.id, claim_time)
+    except sqlite3.IntegrityError:
         await ctx.send("❌ You already have an active claimed ticket! Please complete it first.")
-        conn.close()
+        return
+    if not claimed:
+        await ctx.send("❌ This ticket has already been claimed by another exchanger!")
         return
     
-    conn.close()
+    embed = discord.Embed(
+        title="✅ Ticket Claimed!",
+        description=f"This ticket has been claimed by {ctx.author.mention}",
+        color=discord.Color.green()
+    )
+    embed.add_field(name="Exchanger", value=ctx.author.mention, inline=True)
+    embed.add_field(name="Amount", value=f"${ticket_amount:.2f}", inline=True)
+    embed.set_footer(text=f"Claimed at {claim_time} IST")
     
-    async for message in ctx.channel.history(limit=10, oldest_first=True):
+    await ctx.send(embed=embed)
+    renames.request(ctx.channel, new_name)
+
+def ticket_base_name(channel, ticket):
+    # Parsed from the latest requested name, so it does not matter whether a queued rename has landed yet.
+    parts = renames.desired_name(channel).split('-')
+    username = parts[2] if len(parts) >= 3 else str(ticket.client_id)
+    return f"{ticket.exchange_type.lower()}-{username}"
+
+def is_ticket_channel(channel):
+    if active_tickets.by_channel(channel.id):
+        return True
+    # Completed tickets leave active_tickets but keep their ticket name until staff close them.
+    channel_name = renames.desired_name(channel)
+    return channel_name.startswith("uc-") or channel_name.startswith("c-")
+
+LEGACY_AMOUNT_FIELDS = {
+    "Amount in USD": ('amount_usd', "$"),
+    "Amount in INR": ('amount_inr', "₹"),
+    "Amount in NPR": ('amount_npr', "रू")
+}
+
+async def parse_legacy_ticket(channel):
+    # Only tickets opened before active_tickets stored the amounts need this history scan.
+    async for message in channel.history(limit=10, oldest_first=True):
         if message.embeds:
-            embed_data = message.embeds[0]
-            for field in embed_data.fields:
-                if field.name == "Amount in USD":
-                    amount_str = field.value.replace("$", "").replace(",", "")
+            details = {}
+            for field in message.embeds[0].fields:
+                if field.name == "User":
+                    if "<@" in field.value:
+                        details['client_id'] = int(field.value.replace("<@", "").replace(">", "").replace("!", ""))
+                elif field.name == "Type":
+                    details['exchange_type'] = field.value
+                elif field.name == "Crypto":
+                    details['crypto'] = field.value
+                elif field.name in LEGACY_AMOUNT_FIELDS:
+                    key, symbol = LEGACY_AMOUNT_FIELDS[field.name]
                     try:
-                        ticket_amount = float(amount_str)
+                        details[key] = float(field.value.replace(symbol, "").replace(",", ""))
                     except ValueError:
-                        await ctx.send("❌ Could not parse ticket amount!")
-                        return
-                    if ticket_amount > security_holding / 2:
-                        await ctx.send(f"❌ Ticket Amount Exceed your limit.\nYour limit: ${security_holding / 2:.2f}\nTicket amount: ${ticket_amount:.2f}")
-                        return
-                    
-                    username = parts[2]
-                    new_name = f"c-{ticket_type.lower()}-{username}-{ctx.author.name}"
-                    
-                    ist = pytz.timezone('Asia/Kolkata')
-                    claim_time = datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    conn = sqlite3.connect('exchangers.db')
-                    c = conn.cursor()
-                    c.execute('UPDATE active_tickets SET exchanger_id = ?, claim_time = ? WHERE channel_id = ?', 
-                              (ctx.author.id, claim_time, ctx.channel.id))
-                    conn.commit()
-                    conn.close()
-                    
-                    embed = discord.Embed(
-                        title="✅ Ticket Claimed!",
-                        description=f"This ticket has been claimed by {ctx.author.mention}",
-                        color=discord.Color.green()
-                    )
-                    embed.add_field(name="Exchanger", value=ctx.author.mention, inline=True)
-                    embed.add_field(name="Amount", value=f"${ticket_amount:.2f}", inline=True)
-                    embed.set_footer(text=f"Claimed at {claim_time} IST")
-                    
-                    await ctx.send(embed=embed)
-                    
-                    try:
-                        await ctx.channel.edit(name=new_name)
-                    except discord.HTTPException as e:
-                        if e.status == 429:
-                            await ctx.send("⏳ Channel will be renamed shortly due to rate limiting...")
-                        else:
-                            pass
-                    
-                    return
-    await ctx.send("❌ Could not find ticket information!")
+                        details[key] = None
+            return details
+    return None
 
 
 
-class FeedbackModal(discord.ui.Modal):
+class FeedbackModal(TracedInteraction, discord.ui.Modal):
     def __init__(self, exchanger_id: int, exchange_type: str):
         super().__init__(title="Give Feedback")
         self.exchanger_id = exchanger_id
@@ -647,15 +873,13 @@ class FeedbackModal(discord.ui.Modal):
         stars = "⭐" * rating
         feedback_text = self.feedback_input.value
         
-        feedback_channel = interaction.guild.get_channel(1443940712482869440)
+        feedback_channel = config_channel(interaction.guild, 'feedback_channel')
         if feedback_channel:
-            exchanger = await interaction.guild.fetch_member(self.exchanger_id)
-            
             embed = discord.Embed(
                 title="<:love:1444213564175810592> Sky -  New Feedback",
                 color=discord.Color.gold()
             )
-            embed.add_field(name="Exchanger", value=exchanger.mention, inline=True)
+            embed.add_field(name="Exchanger", value=f"<@{self.exchanger_id}>", inline=True)
             embed.add_field(name="Exchange Type", value=self.exchange_type, inline=True)
             embed.add_field(name="Rating", value=stars, inline=False)
             embed.add_field(name="Feedback", value=feedback_text, inline=False)
@@ -665,63 +889,76 @@ class FeedbackModal(discord.ui.Modal):
         
         await interaction.response.send_message("✅ Thank you for your feedback!", ephemeral=True)
 
-class VouchButtonView(discord.ui.View):
-    def __init__(self, exchanger_id: int, exchange_type: str, from_currency: str, to_currency: str, amount_usd: float, amount_local: float, crypto: str = None):
-        super().__init__(timeout=None)
-        self.exchanger_id = exchanger_id
-        self.exchange_type = exchange_type
-        self.from_currency = from_currency
-        self.to_currency = to_currency
-        self.amount_usd = amount_usd
-        self.amount_local = amount_local
-        self.crypto = crypto
+def vouch_text(exchanger_id, exchange_type, amount_usd, amount_local, crypto):
+    crypto_name = crypto if crypto else "Crypto"
+    local_amount = f"{amount_local:.2f}" if amount_local is not None else "?"
+    if exchange_type in ["I2C", "N2C"]:
+        currency_symbol = "₹" if exchange_type == "I2C" else "रू"
+        payment_method = "UPI" if exchange_type == "I2C" else "Esewa"
+        return f"+rep {exchanger_id} Legit {exchange_type} Exchange of {currency_symbol}{local_amount} {payment_method} to ${amount_usd:.2f} {crypto_name} | TY !!"
+    currency_symbol = "₹" if exchange_type == "C2I" else "रू"
+    payment_method = "UPI" if exchange_type == "C2I" else "Esewa"
+    return f"+rep {exchanger_id} Legit {exchange_type} Exchange of ${amount_usd:.2f} {crypto_name} to {currency_symbol}{local_amount} {payment_method} | TY !!"
+
+class VouchButton(TracedInteraction, discord.ui.DynamicItem[discord.ui.Button], template=r'vouch:(?P<trade_id>[0-9]+)'):
+    def __init__(self, trade_id: int):
+        super().__init__(discord.ui.Button(label="Copy Vouch", style=discord.ButtonStyle.blurple, emoji="📋", custom_id=f"vouch:{trade_id}"))
+        self.trade_id = trade_id
     
-    @discord.ui.button(label="Copy Vouch", style=discord.ButtonStyle.blurple, emoji="📋", custom_id="vouch_button")
-    async def vouch_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.exchange_type in ["I2C", "N2C"]:
-            currency_symbol = "₹" if self.exchange_type == "I2C" else "रू"
-            payment_method = "UPI" if self.exchange_type == "I2C" else "Esewa"
-            crypto_name = self.crypto if self.crypto else "Crypto"
-            vouch_format = f"+rep {self.exchanger_id} Legit {self.exchange_type} Exchange of {currency_symbol}{self.amount_local:.2f} {payment_method} to ${self.amount_usd:.2f} {crypto_name} | TY !!"
-        else:
-            currency_symbol = "₹" if self.exchange_type == "C2I" else "रू"
-            payment_method = "UPI" if self.exchange_type == "C2I" else "Esewa"
-            crypto_name = self.crypto if self.crypto else "Crypto"
-            vouch_format = f"+rep {self.exchanger_id} Legit {self.exchange_type} Exchange of ${self.amount_usd:.2f} {crypto_name} to {currency_symbol}{self.amount_local:.2f} {payment_method} | TY !!"
-        await interaction.response.send_message(f"{vouch_format}", ephemeral=True)
-    
-    @discord.ui.button(label="Give Feedback", style=discord.ButtonStyle.green, emoji="📝", custom_id="feedback_button")
-    async def feedback_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        modal = FeedbackModal(self.exchanger_id, self.exchange_type)
-        await interaction.response.send_modal(modal)
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match['trade_id']))
+    
+    async def callback(self, interaction: discord.Interaction):
+        trade = await db.fetchone('SELECT exchanger_id, exchange_type, amount_usd, amount_local, crypto FROM trades WHERE id = ? AND guild_id = ?',
+                                 (self.trade_id, interaction.guild_id))
+        if not trade:
+            await interaction.response.send_message("❌ This deal could not be found!", ephemeral=True)
+            return
+        await interaction.response.send_message(vouch_text(*trade), ephemeral=True)
+
+class FeedbackButton(TracedInteraction, discord.ui.DynamicItem[discord.ui.Button], template=r'feedback:(?P<trade_id>[0-9]+)'):
+    def __init__(self, trade_id: int):
+        super().__init__(discord.ui.Button(label="Give Feedback", style=discord.ButtonStyle.green, emoji="📝", custom_id=f"feedback:{trade_id}"))
+        self.trade_id = trade_id
+    
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match['trade_id']))
+    
+    async def callback(self, interaction: discord.Interaction):
+        trade = await db.fetchone('SELECT exchanger_id, exchange_type FROM trades WHERE id = ? AND guild_id = ?', (self.trade_id, interaction.guild_id))
+        if not trade:
+            await interaction.response.send_message("❌ This deal could not be found!", ephemeral=True)
+            return
+        await interaction.response.send_modal(FeedbackModal(*trade))
+
+def vouch_buttons(trade_id):
+    view = discord.ui.View(timeout=None)
+    view.add_item(VouchButton(trade_id))
+    view.add_item(FeedbackButton(trade_id))
+    # A stopped view is sent as plain components and never kept in the view store;
+    # clicks are routed to the dynamic items registered in setup_hook instead.
+    view.stop()
+    return view
 
 @bot.command(name="unclaim")
 async def unclaim_ticket(ctx):
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT user_id FROM exchangers WHERE user_id = ?', (ctx.author.id,))
-    if not c.fetchone():
+    if not await db.fetchone('SELECT user_id FROM exchangers WHERE guild_id = ? AND user_id = ?', (ctx.guild.id, ctx.author.id)):
         await ctx.send("❌ You must be an exchanger to use this command!")
-        conn.close()
         return
-    conn.close()
     
-    channel_name = ctx.channel.name
-    if not channel_name.startswith("c-"):
+    ticket = active_tickets.by_channel(ctx.channel.id)
+    
+    if not ticket:
         await ctx.send("❌ This is not a claimed ticket channel!")
         return
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT exchanger_id, claim_time FROM active_tickets WHERE channel_id = ?', (ctx.channel.id,))
-    ticket_data = c.fetchone()
-    conn.close()
-    
-    if not ticket_data or not ticket_data[0]:
+    if not ticket.exchanger_id:
         await ctx.send("❌ This ticket is not claimed!")
         return
     
-    exchanger_id, claim_time_str = ticket_data
+    exchanger_id, claim_time_str = ticket.exchanger_id, ticket.claim_time
     
     if exchanger_id != ctx.author.id:
         await ctx.send("❌ Only the claimer can unclaim this ticket!")
@@ -739,20 +976,10 @@ async def unclaim_ticket(ctx):
             await ctx.send(f"❌ You can only unclaim after 5 minutes! Please wait {remaining:.1f} more minutes.")
             return
     
-    parts = channel_name.split('-')
-    ticket_type = None
-    if len(parts) >= 4:
-        ticket_type = parts[1].upper()
-        username = parts[2]
-        new_name = f"uc-{parts[1]}-{username}"
-        await ctx.channel.edit(name=new_name)
-    
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('UPDATE active_tickets SET exchanger_id = ?, claim_time = ? WHERE channel_id = ?', 
-              (None, None, ctx.channel.id))
-    conn.commit()
-    conn.close()
+    ticket_type = ticket.exchange_type
+    renames.request(ctx.channel, f"uc-{ticket_base_name(ctx.channel, ticket)}")
+    
+    await active_tickets.unclaim(ctx.channel.id)
     
     embed = discord.Embed(
         title="🔓 Ticket Unclaimed",
@@ -760,16 +987,9 @@ async def unclaim_ticket(ctx):
         color=discord.Color.orange()
     )
     
-    role_names = {
-        'I2C': '# I2C Exchanger',
-        'C2I': '# C2I Exchanger',
-        'N2C': '# N2C Exchanger',
-        'C2N': '# C2N Exchanger'
-    }
-    
     mention_text = ""
-    if ticket_type and ticket_type in role_names:
-        exchanger_role = discord.utils.get(ctx.guild.roles, name=role_names[ticket_type])
+    if ticket_type and ticket_type in EXCHANGER_ROLE_NAMES:
+        exchanger_role = guild_indexes.role(ctx.guild, EXCHANGER_ROLE_NAMES[ticket_type])
         if exchanger_role:
             mention_text = exchanger_role.mention
     
@@ -777,24 +997,21 @@ async def unclaim_ticket(ctx):
 
 @bot.command(name="notify")
 async def notify_client(ctx):
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT user_id FROM exchangers WHERE user_id = ?', (ctx.author.id,))
-    if not c.fetchone():
+    if not await db.fetchone('SELECT user_id FROM exchangers WHERE guild_id = ? AND user_id = ?', (ctx.guild.id, ctx.author.id)):
         await ctx.send("❌ You must be an exchanger to use this command!")
-        conn.close()
         return
     
-    c.execute('SELECT client_id FROM active_tickets WHERE channel_id = ?', (ctx.channel.id,))
-    ticket_data = c.fetchone()
-    conn.close()
+    ticket = active_tickets.by_channel(ctx.channel.id)
     
-    if not ticket_data:
+    if not ticket:
         await ctx.send("❌ This is not a ticket channel!")
         return
     
-    client_id = ticket_data[0]
-    client = await ctx.guild.fetch_member(client_id)
+    client_id = ticket.client_id
+    client = await members.get(ctx.guild, client_id)
+    if not client:
+        await ctx.send("❌ The client is no longer in the server!")
+        return
     
     try:
         embed = discord.Embed(
@@ -815,301 +1032,233 @@ async def notify_client(ctx):
 
 @bot.command(name="done")
 async def done_ticket(ctx):
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT user_id FROM exchangers WHERE user_id = ?', (ctx.author.id,))
-    if not c.fetchone():
+    if not await db.fetchone('SELECT user_id FROM exchangers WHERE guild_id = ? AND user_id = ?', (ctx.guild.id, ctx.author.id)):
         await ctx.send("❌ You must be an exchanger to use this command!")
-        conn.close()
         return
-    conn.close()
     
-    channel_name = ctx.channel.name
-    if not (channel_name.startswith("uc-") or channel_name.startswith("c-")):
+    ticket = active_tickets.by_channel(ctx.channel.id)
+    if not ticket:
         await ctx.send("❌ This is not a ticket channel!")
         return
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT exchanger_id FROM active_tickets WHERE channel_id = ?', (ctx.channel.id,))
-    ticket_data = c.fetchone()
-    conn.close()
-    
-    if not ticket_data or not ticket_data[0]:
+    if not ticket.exchanger_id:
         await ctx.send("❌ This ticket has not been claimed yet!")
         return
     
-    claimer_id = ticket_data[0]
+    claimer_id, client_id, exchange_type = ticket.exchanger_id, ticket.client_id, ticket.exchange_type
+    amount_usd, amount_local, crypto = ticket.amount_usd, ticket.amount_local, ticket.crypto
     
     if claimer_id != ctx.author.id:
         await ctx.send("❌ Only the claimer can mark this ticket as done!")
         return
-    exchanger_id = None
-    client_id = None
-    exchange_type = None
-    crypto = None
-    amount_usd = None
-    amount_inr = None
-    amount_npr = None
-    async for message in ctx.channel.history(limit=10, oldest_first=True):
-        if message.embeds:
-            embed = message.embeds[0]
-            for field in embed.fields:
-                if field.name == "User":
-                    user_mention = field.value
-                    if "<@" in user_mention:
-                        client_id = int(user_mention.replace("<@", "").replace(">", "").replace("!", ""))
-                elif field.name == "Type":
-                    exchange_type = field.value
-                elif field.name == "Crypto":
-                    crypto = field.value
-                elif field.name == "Amount in USD":
-                    amount_str = field.value.replace("$", "").replace(",", "")
-                    try:
-                        amount_usd = float(amount_str)
-                    except ValueError:
-                        pass
-                elif field.name == "Amount in INR":
-                    amount_str = field.value.replace("₹", "").replace(",", "")
-                    try:
-                        amount_inr = float(amount_str)
-                    except ValueError:
-                        pass
-                elif field.name == "Amount in NPR":
-                    amount_str = field.value.replace("रू", "").replace(",", "")
-                    try:
-                        amount_npr = float(amount_str)
-                    except ValueError:
-                        pass
-            exchanger_id = claimer_id
-            break
+    exchanger_id = claimer_id
+    if amount_usd is None:
+        legacy_details = await parse_legacy_ticket(ctx.channel) or {}
+        client_id = client_id or legacy_details.get('client_id')
+        exchange_type = exchange_type or legacy_details.get('exchange_type')
+        crypto = legacy_details.get('crypto')
+        amount_usd = legacy_details.get('amount_usd')
+        amount_local = legacy_details.get('amount_inr') or legacy_details.get('amount_npr')
     if not exchange_type or not exchanger_id or not client_id or not amount_usd:
         await ctx.send("❌ Could not find ticket information!")
         return
     ist = pytz.timezone('Asia/Kolkata')
     trade_date = datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S')
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('INSERT INTO trades (exchanger_id, client_id, exchange_type, amount_usd, crypto, date) VALUES (?, ?, ?, ?, ?, ?)',
-              (exchanger_id, client_id, exchange_type, amount_usd, crypto, trade_date))
-    
-    c.execute('INSERT OR IGNORE INTO fees (user_id, total_fee) VALUES (?, 0)', (exchanger_id,))
-    c.execute('UPDATE fees SET total_fee = total_fee + 0.025 WHERE user_id = ?', (exchanger_id,))
-    
-    conn.commit()
-    conn.close()
+    guild_id = ctx.guild.id
+    def record_trade(c):
+        c.execute('DELETE FROM active_tickets WHERE channel_id = ?', (ctx.channel.id,))
+        if not c.rowcount:
+            return None
+        c.execute('INSERT INTO trades (guild_id, exchanger_id, client_id, exchange_type, amount_usd, amount_local, crypto, date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                  (guild_id, exchanger_id, client_id, exchange_type, amount_usd, amount_local, crypto, trade_date))
+        trade_id = c.lastrowid
+        
+        record_fee(c, guild_id, exchanger_id, FEE_PER_DEAL, f"Deal #{trade_id}")
+        index_trade(c, guild_id, trade_id, client_id, exchanger_id, exchange_type, amount_usd, crypto, trade_date)
+        
+        totals = []
+        for user_id, role in ((client_id, 'client'), (exchanger_id, 'exchanger')):
+            c.execute('''INSERT INTO user_totals (guild_id, user_id, role, trade_count, volume_usd) VALUES (?, ?, ?, 1, ?)
+                         ON CONFLICT (guild_id, user_id, role) DO UPDATE SET trade_count = trade_count + 1, volume_usd = volume_usd + excluded.volume_usd''',
+                      (guild_id, user_id, role, amount_usd))
+            c.execute('SELECT volume_usd FROM user_totals WHERE guild_id = ? AND user_id = ? AND role = ?', (guild_id, user_id, role))
+            totals.append(c.fetchone()[0])
+        return trade_id, totals
+    result = await db.write(record_trade)
+    active_tickets.discard(ctx.channel.id)
+    if result is None:
+        await ctx.send("❌ This ticket has already been completed!")
+        return
+    trade_id, (client_total, exchanger_total) = result
     guild = ctx.guild
-    client = await guild.fetch_member(client_id)
-    exchanger = await guild.fetch_member(exchanger_id)
-    role_names = {
-        'I2C': '# I2C',
-        'C2I': '# C2I',
-        'N2C': '# N2C',
-        'C2N': '# C2N'
-    }
-    client_role = discord.utils.get(guild.roles, name=role_names.get(exchange_type, ''))
-    if client_role:
-        await client.add_roles(client_role)
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT SUM(amount_usd) FROM trades WHERE client_id = ?', (client_id,))
-    client_total = c.fetchone()[0] or 0.0
+    timer = StepTimer(f'.done in #{ctx.channel.name}')
+    client_roles = [guild_indexes.role(guild, CLIENT_ROLE_NAMES.get(exchange_type, ''))]
     if client_total >= 1000:
-        role = guild.get_role(1443936663947579402)
-        if role:
-            await client.add_roles(role)
+        client_roles.append(config_role(guild, 'client_tier4_role'))
     elif client_total >= 500:
-        role = guild.get_role(1443936664035659819)
-        if role:
-            await client.add_roles(role)
+        client_roles.append(config_role(guild, 'client_tier3_role'))
     elif client_total >= 100:
-        role = guild.get_role(1443937344808816680)
-        if role:
-            await client.add_roles(role)
+        client_roles.append(config_role(guild, 'client_tier2_role'))
     elif client_total > 0:
-        role = guild.get_role(1443937345849135224)
-        if role:
-            await client.add_roles(role)
-    c.execute('SELECT SUM(amount_usd) FROM trades WHERE exchanger_id = ?', (exchanger_id,))
-    exchanger_total = c.fetchone()[0] or 0.0
+        client_roles.append(config_role(guild, 'client_tier1_role'))
+    exchanger_roles = []
     if exchanger_total >= 1200:
-        role = guild.get_role(1443936660680216688)
-        if role:
-            await exchanger.add_roles(role)
+        exchanger_roles.append(config_role(guild, 'exchanger_tier2_role'))
     elif exchanger_total >= 400:
-        role = guild.get_role(1443936661250642021)
-        if role:
-            await exchanger.add_roles(role)
-    conn.close()
+        exchanger_roles.append(config_role(guild, 'exchanger_tier1_role'))
+    
+    async def award_roles():
+        # Members are fetched once and reused; everything else only needs their mentions.
+        if client_id == exchanger_id:
+            client = await timer.step('fetch_members', members.get(guild, client_id))
+            if client:
+                await timer.step('roles', reconcile_roles(client, add=client_roles + exchanger_roles))
+            return
+        resolved = await timer.step('fetch_members', members.get_many(guild, [client_id, exchanger_id]))
+        await timer.step('roles', asyncio.gather(*(reconcile_roles(resolved[user_id], add=roles)
+                                                   for user_id, roles in ((client_id, client_roles), (exchanger_id, exchanger_roles))
+                                                   if user_id in resolved)))
+    
+    exchanger_mention = f"<@{exchanger_id}>"
+    client_mention = f"<@{client_id}>"
     if exchange_type in ["I2C", "N2C"]:
         from_currency = "UPI" if exchange_type == "I2C" else "Esewa"
         to_currency = crypto if crypto else "Crypto"
-        amount_local = amount_inr if amount_inr else amount_npr
     else:  # C2I or C2N
         from_currency = crypto if crypto else "Crypto"
         to_currency = "UPI" if exchange_type == "C2I" else "Esewa"
-        amount_local = amount_inr if amount_inr else amount_npr
     embed = discord.Embed(
         title="<:thumb:1444212018147233943> Deal Completed!",
-        description=f"This deal has been completed by {exchanger.mention} for {amount_local:.2f} {from_currency} to ${amount_usd:.2f} {to_currency}. We kindly request you to vouch and give feedback which means a lot to us!",
+        description=f"This deal has been completed by {exchanger_mention} for {amount_local:.2f} {from_currency} to ${amount_usd:.2f} {to_currency}. We kindly request you to vouch and give feedback which means a lot to us!",
         color=discord.Color.green()
     )
-    view = VouchButtonView(exchanger_id, exchange_type, from_currency, to_currency, amount_usd, amount_local, crypto)
-    await ctx.send(f"{exchanger.mention}{client.mention}",embed=embed, view=view)
-    log_channel = guild.get_channel(1444179898737361109)
+    view = vouch_buttons(trade_id)
+    branches = {
+        'award_roles': award_roles(),
+        'completion_message': ctx.send(f"{exchanger_mention}{client_mention}",embed=embed, view=view)
+    }
+    log_channel = config_channel(guild, 'log_channel')
     if log_channel:
-        exchanger = await guild.fetch_member(exchanger_id)
         log_embed = discord.Embed(
             title="<:thumb:1444212018147233943> Deal Completed",
             color=discord.Color.blue(),
             timestamp=datetime.now(ist)
         )
-        log_embed.add_field(name="Exchanger", value=exchanger.mention, inline=True)
-        log_embed.add_field(name="Client", value=client.mention, inline=True)
+        log_embed.add_field(name="Exchanger", value=exchanger_mention, inline=True)
+        log_embed.add_field(name="Client", value=client_mention, inline=True)
         log_embed.add_field(name="Type", value=exchange_type, inline=True)
         log_embed.add_field(name="Crypto", value=crypto, inline=True)
         log_embed.add_field(name="Amount (USD)", value=f"${amount_usd:.2f}", inline=True)
         log_embed.add_field(name="Date (IST)", value=trade_date, inline=True)
-        await log_channel.send(embed=log_embed)
+        branches['private_log'] = log_channel.send(embed=log_embed)
     
-    public_log_channel = guild.get_channel(1444222323124342945)
+    public_log_channel = config_channel(guild, 'public_log_channel')
     if public_log_channel:
-        exchanger = await guild.fetch_member(exchanger_id)
         public_embed = discord.Embed(
             title="<:thumb:1444212018147233943> Deal Completed",
             color=discord.Color.green(),
             timestamp=datetime.now(ist)
         )
-        public_embed.add_field(name="Exchanger", value=exchanger.mention, inline=True)
+        public_embed.add_field(name="Exchanger", value=exchanger_mention, inline=True)
         public_embed.add_field(name="Client", value="Anonymous", inline=True)
         public_embed.add_field(name="Type", value=exchange_type, inline=True)
         public_embed.add_field(name="Crypto", value=crypto, inline=True)
         public_embed.add_field(name="Amount (USD)", value=f"${amount_usd:.2f}", inline=True)
         public_embed.add_field(name="Date (IST)", value=trade_date, inline=True)
-        await public_log_channel.send(embed=public_embed)
-    done_category = discord.utils.get(guild.categories, name="# Done")
+        branches['public_log'] = public_log_channel.send(embed=public_embed)
+    done_category = guild_indexes.category(guild, "# Done")
     if done_category:
-        await ctx.channel.edit(category=done_category)
+        branches['move_category'] = ctx.channel.edit(category=done_category)
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('DELETE FROM active_tickets WHERE channel_id = ?', (ctx.channel.id,))
-    conn.commit()
-    conn.close()
+    await timer.gather(**branches)
+    timer.report()
 
 @bot.tree.command(name="forceclose", description="Force close a ticket and delete it")
 async def forceclose(interaction: discord.Interaction):
-    channel_name = interaction.channel.name
-    if not (channel_name.startswith("uc-") or channel_name.startswith("c-")):
+    if not is_ticket_channel(interaction.channel):
         await interaction.response.send_message("❌ This is not a ticket channel!", ephemeral=True)
         return
     
     await interaction.response.send_message("🗑️ Force closing ticket and deleting channel...", ephemeral=True)
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('DELETE FROM active_tickets WHERE channel_id = ?', (interaction.channel.id,))
-    conn.commit()
-    conn.close()
+    await active_tickets.remove(interaction.channel.id)
     
     await interaction.channel.delete()
 
 @bot.command(name="close")
 async def close_ticket(ctx):
-    staff_role = ctx.guild.get_role(1443936660063518770)
+    staff_role = config_role(ctx.guild, 'staff_role')
     if not staff_role or staff_role not in ctx.author.roles:
         await ctx.send("❌ You don't have permission to use this command!")
         return
     
-    channel_name = ctx.channel.name
-    if not (channel_name.startswith("uc-") or channel_name.startswith("c-")):
+    if not is_ticket_channel(ctx.channel):
         await ctx.send("❌ This is not a ticket channel!")
         return
     
-    await ctx.send("📝 Creating transcript and closing ticket...")
+    # The ticket stays registered until the channel is actually deleted (see on_guild_channel_delete),
+    # so a close whose transcript fails can simply be retried.
+    ticket = active_tickets.by_channel(ctx.channel.id)
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT client_id, exchanger_id FROM active_tickets WHERE channel_id = ?', (ctx.channel.id,))
-    ticket_data = c.fetchone()
-    c.execute('DELETE FROM active_tickets WHERE channel_id = ?', (ctx.channel.id,))
-    conn.commit()
-    conn.close()
+    client_id = ticket.client_id if ticket else None
+    exchanger_id = ticket.exchanger_id if ticket and ticket.exchanger_id else None
     
-    client_id = ticket_data[0] if ticket_data else None
-    exchanger_id = ticket_data[1] if ticket_data and ticket_data[1] else None
-    
-    try:
-        transcript = await chat_exporter.export(ctx.channel)
+    if not transcript_pipeline.submit(TranscriptJob(ctx.channel, ctx.author, client_id, exchanger_id)):
+        await ctx.send("⏳ This ticket is already being closed.")
+        return
+    await ctx.send("📝 Creating transcript and closing ticket...")
+
+async def publish_transcript(job, record):
+    guild = job.channel.guild
+    download_url = None
+    transcript_channel = config_channel(guild, 'transcript_channel')
+    if transcript_channel:
+        embed = discord.Embed(
+            title="📋 Ticket Transcript",
+            description=f"Transcript for #{record.channel_name}",
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="Closed by", value=job.closed_by.mention, inline=True)
+        embed.add_field(name="Channel", value=record.channel_name, inline=True)
+        embed.add_field(name="Transcript ID", value=f"`{record.id}`", inline=True)
+        embed.add_field(name="Closed at", value=record.closed_at, inline=False)
         
-        if transcript:
-            transcript_file = discord.File(
-                io.BytesIO(transcript.encode()),
-                filename=f"transcript-{ctx.channel.name}.html"
-            )
-            
-            transcript_channel = ctx.guild.get_channel(1444225280397938850)
-            if transcript_channel:
-                embed = discord.Embed(
-                    title="📋 Ticket Transcript",
-                    description=f"Transcript for {ctx.channel.mention}",
-                    color=discord.Color.blue()
-                )
-                embed.add_field(name="Closed by", value=ctx.author.mention, inline=True)
-                embed.add_field(name="Channel", value=ctx.channel.name, inline=True)
-                
-                ist = pytz.timezone('Asia/Kolkata')
-                close_time = datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S')
-                embed.add_field(name="Closed at", value=close_time, inline=False)
-                
-                await transcript_channel.send(embed=embed, file=transcript_file)
-            
-            if client_id:
-                try:
-                    client = await ctx.guild.fetch_member(client_id)
-                    transcript_file_client = discord.File(
-                        io.BytesIO(transcript.encode()),
-                        filename=f"transcript-{ctx.channel.name}.html"
-                    )
-                    await client.send(
-                        f"📋 Your ticket **{ctx.channel.name}** has been closed by staff.\nHere's the transcript:",
-                        file=transcript_file_client
-                    )
-                except:
-                    pass
-            
-            if exchanger_id:
-                try:
-                    exchanger = await ctx.guild.fetch_member(exchanger_id)
-                    transcript_file_exchanger = discord.File(
-                        io.BytesIO(transcript.encode()),
-                        filename=f"transcript-{ctx.channel.name}.html"
-                    )
-                    await exchanger.send(
-                        f"📋 Ticket **{ctx.channel.name}** has been closed by staff.\nHere's the transcript:",
-                        file=transcript_file_exchanger
-                    )
-                except:
-                    pass
-    
-    except Exception as e:
-        await ctx.send(f"⚠️ Error creating transcript: {str(e)}")
-    
-    await ctx.channel.delete()
+        transcript_file = discord.File(io.BytesIO(record.data), filename=f"transcript-{record.channel_name}.html")
+        message = await transcript_channel.send(embed=embed, file=transcript_file)
+        if message.attachments:
+            download_url = message.attachments[0].url
+        await db.execute('UPDATE transcripts SET message_url = ? WHERE id = ?', (message.jump_url, record.id))
+    
+    reference = f"Transcript ID: `{record.id}`"
+    if download_url:
+        reference += f"\nHere's the transcript: {download_url}"
+    recipients = await members.get_many(guild, [user_id for user_id in (job.client_id, job.exchanger_id) if user_id])
+    
+    async def notify(user_id, text):
+        member = recipients.get(user_id)
+        if member:
+            try:
+                await member.send(f"{text}\n{reference}")
+            except discord.HTTPException:
+                pass
+    await asyncio.gather(
+        notify(job.client_id, f"📋 Your ticket **{record.channel_name}** has been closed by staff."),
+        notify(job.exchanger_id, f"📋 Ticket **{record.channel_name}** has been closed by staff.")
+    )
+
+transcript_pipeline = TranscriptPipeline(
+    TranscriptArchive(db),
+    transcript_renderer if TRANSCRIPT_RENDER_MODE == 'process' else chat_exporter.export,
+    publish_transcript
+)
 
-class FeeButtonView(discord.ui.View):
+class FeeButtonView(TracedInteraction, discord.ui.View):
     def __init__(self):
         super().__init__(timeout=None)
     
     @discord.ui.button(label="Check Fee", style=discord.ButtonStyle.blurple, emoji="<:thaila:1425067683300507669>", custom_id="check_fee_button")
     async def check_fee_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        conn = sqlite3.connect('exchangers.db')
-        c = conn.cursor()
-        c.execute('SELECT total_fee FROM fees WHERE user_id = ?', (interaction.user.id,))
-        result = c.fetchone()
-        conn.close()
-        
-        total_fee = result[0] if result else 0.0
+        total_fee = await db.run('fee balance', lambda conn: fee_balance(conn.cursor(), interaction.guild_id, interaction.user.id))
         
         embed = discord.Embed(
             title="<:thaila:1425067683300507669> Your Fee Balance",
@@ -1122,7 +1271,7 @@ class FeeButtonView(discord.ui.View):
 
 @bot.tree.command(name="feepanel", description="Send the fee panel")
 async def feepanel(interaction: discord.Interaction):
-    required_role = interaction.guild.get_role(1443936237349240872)
+    required_role = config_role(interaction.guild, 'admin_role')
     if not required_role or required_role not in interaction.user.roles:
         await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
         return
@@ -1141,68 +1290,52 @@ async def feepanel(interaction: discord.Interaction):
 @bot.tree.command(name="addfee", description="Add fee to an exchanger")
 @app_commands.describe(user="The exchanger", amount="Amount to add")
 async def addfee(interaction: discord.Interaction, user: discord.Member, amount: float):
-    required_role = interaction.guild.get_role(1443936237349240872)
+    required_role = config_role(interaction.guild, 'admin_role')
     if not required_role or required_role not in interaction.user.roles:
         await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
         return
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('INSERT OR IGNORE INTO fees (user_id, total_fee) VALUES (?, 0)', (user.id,))
-    c.execute('UPDATE fees SET total_fee = total_fee + ? WHERE user_id = ?', (amount, user.id))
-    conn.commit()
-    conn.close()
+    await db.write(lambda c: record_fee(c, interaction.guild.id, user.id, amount, "Added by staff", interaction.user.id), label='addfee')
     
     await interaction.response.send_message(f"✅ Added ${amount:.2f} fee to {user.mention}", ephemeral=True)
 
 @bot.tree.command(name="deductfee", description="Deduct fee from an exchanger")
 @app_commands.describe(user="The exchanger", amount="Amount to deduct")
 async def deductfee(interaction: discord.Interaction, user: discord.Member, amount: float):
-    required_role = interaction.guild.get_role(1443936237349240872)
+    required_role = config_role(interaction.guild, 'admin_role')
     if not required_role or required_role not in interaction.user.roles:
         await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
         return
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('INSERT OR IGNORE INTO fees (user_id, total_fee) VALUES (?, 0)', (user.id,))
-    c.execute('UPDATE fees SET total_fee = total_fee - ? WHERE user_id = ?', (amount, user.id))
-    conn.commit()
-    conn.close()
+    await db.write(lambda c: record_fee(c, interaction.guild.id, user.id, -amount, "Deducted by staff", interaction.user.id), label='deductfee')
     
     await interaction.response.send_message(f"✅ Deducted ${amount:.2f} fee from {user.mention}", ephemeral=True)
 
 @bot.tree.command(name="clearfee", description="Clear all fees for an exchanger")
 @app_commands.describe(user="The exchanger")
 async def clearfee(interaction: discord.Interaction, user: discord.Member):
-    required_role = interaction.guild.get_role(1443936237349240872)
+    required_role = config_role(interaction.guild, 'admin_role')
     if not required_role or required_role not in interaction.user.roles:
         await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
         return
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('UPDATE fees SET total_fee = 0 WHERE user_id = ?', (user.id,))
-    conn.commit()
-    conn.close()
+    def clear_fee(c):
+        balance = fee_balance(c, interaction.guild.id, user.id)
+        if balance:
+            record_fee(c, interaction.guild.id, user.id, -balance, "Cleared by staff", interaction.user.id)
+    await db.write(clear_fee)
     
     await interaction.response.send_message(f"✅ Cleared all fees for {user.mention}", ephemeral=True)
 
 @bot.tree.command(name="checkfee", description="Check fee balance of an exchanger")
 @app_commands.describe(exchanger="The exchanger to check")
 async def checkfee(interaction: discord.Interaction, exchanger: discord.Member):
-    required_role = interaction.guild.get_role(1443936237349240872)
+    required_role = config_role(interaction.guild, 'admin_role')
     if not required_role or required_role not in interaction.user.roles:
         await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
         return
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT total_fee FROM fees WHERE user_id = ?', (exchanger.id,))
-    result = c.fetchone()
-    conn.close()
-    
-    total_fee = result[0] if result else 0.0
+    total_fee = await db.run('fee balance', lambda conn: fee_balance(conn.cursor(), interaction.guild.id, exchanger.id))
     
     embed = discord.Embed(
         title=f"<:thaila:1425067683300507669> Fee Balance - {exchanger.display_name}",
@@ -1214,9 +1347,134 @@ async def checkfee(interaction: discord.Interaction, exchanger: discord.Member):
     
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
+class FeeStatementView(TracedInteraction, discord.ui.View):
+    def __init__(self, exchanger: discord.Member, rows: list):
+        super().__init__(timeout=300)
+        self.exchanger = exchanger
+        self.rows = rows
+    
+    def build_embed(self):
+        embed = discord.Embed(
+            title=f"<:thaila:1425067683300507669> Fee Statement - {self.exchanger.display_name}",
+            color=discord.Color.gold()
+        )
+        if not self.rows:
+            embed.description = "No fee history yet"
+            return embed
+        lines = []
+        for event_id, amount, reason, actor_id, date in self.rows:
+            sign = "+" if amount >= 0 else "-"
+            lines.append(f"> `#{event_id}` **{sign}${abs(amount):.3f}** - {reason} - {date}")
+        embed.description = "\n".join(lines)
+        embed.set_footer(text=f"Entries #{self.rows[-1][0]} to #{self.rows[0][0]}")
+        return embed
+    
+    async def show_page(self, interaction: discord.Interaction, **cursor):
+        rows = await db.run('fee statement', lambda conn: fee_statement(conn.cursor(), self.exchanger.guild.id, self.exchanger.id, **cursor))
+        if not rows:
+            await interaction.response.send_message("❌ No more entries!", ephemeral=True)
+            return
+        self.rows = rows
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+    
+    @discord.ui.button(label="Newer", style=discord.ButtonStyle.gray, emoji="◀️")
+    async def newer_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if not self.rows:
+            await interaction.response.send_message("❌ No more entries!", ephemeral=True)
+            return
+        await self.show_page(interaction, after_id=self.rows[0][0])
+    
+    @discord.ui.button(label="Older", style=discord.ButtonStyle.gray, emoji="▶️")
+    async def older_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if not self.rows:
+            await interaction.response.send_message("❌ No more entries!", ephemeral=True)
+            return
+        await self.show_page(interaction, before_id=self.rows[-1][0])
+
+@bot.tree.command(name="feestatement", description="View the fee history of an exchanger")
+@app_commands.describe(exchanger="The exchanger to view (leave empty for yourself)")
+async def feestatement(interaction: discord.Interaction, exchanger: discord.Member = None):
+    target = exchanger if exchanger else interaction.user
+    if target.id != interaction.user.id:
+        required_role = config_role(interaction.guild, 'admin_role')
+        if not required_role or required_role not in interaction.user.roles:
+            await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
+            return
+    
+    rows = await db.run('fee statement', lambda conn: fee_statement(conn.cursor(), interaction.guild.id, target.id))
+    view = FeeStatementView(target, rows)
+    await interaction.response.send_message(embed=view.build_embed(), view=view, ephemeral=True)
+
+class SearchResultsView(TracedInteraction, discord.ui.View):
+    PAGE_SIZE = 10
+    
+    def __init__(self, query: str, rows: list):
+        super().__init__(timeout=300)
+        self.query = query
+        self.offset = 0
+        self.rows = rows
+    
+    def build_embed(self):
+        embed = discord.Embed(
+            title=f"🔎 Search - {self.query}",
+            color=discord.Color.blue()
+        )
+        if not self.rows:
+            embed.description = "No results found"
+            return embed
+        lines = []
+        for kind, ref_id, date, people, exchange_type, crypto, amount, title, snippet, message_url in self.rows[:self.PAGE_SIZE]:
+            mentions = " ↔ ".join(f"<@{user_id}>" for user_id in people.split())
+            if kind == 'trade':
+                lines.append(f"> `Deal #{ref_id}` **{exchange_type}** ${amount} {crypto} - {mentions} - {date}")
+            else:
+                link = f"[#{title}]({message_url})" if message_url else f"#{title}"
+                lines.append(f"> `Transcript #{ref_id}` {link} - {mentions} - {date}")
+                if snippet:
+                    lines.append(f"> ↳ {snippet}")
+        embed.description = "\n".join(lines)[:4096]
+        embed.set_footer(text=f"Results {self.offset + 1} to {self.offset + min(len(self.rows), self.PAGE_SIZE)}")
+        return embed
+    
+    async def show_page(self, interaction: discord.Interaction, offset: int):
+        rows = await db.run('search', lambda conn: search(conn.cursor(), interaction.guild.id, self.query, self.PAGE_SIZE + 1, offset))
+        if not rows:
+            await interaction.response.send_message("❌ No more results!", ephemeral=True)
+            return
+        self.offset = offset
+        self.rows = rows
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+    
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.gray, emoji="◀️")
+    async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.offset == 0:
+            await interaction.response.send_message("❌ No more results!", ephemeral=True)
+            return
+        await self.show_page(interaction, max(0, self.offset - self.PAGE_SIZE))
+    
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.gray, emoji="▶️")
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        # One extra row is fetched per page to know whether a next page exists.
+        if len(self.rows) <= self.PAGE_SIZE:
+            await interaction.response.send_message("❌ No more results!", ephemeral=True)
+            return
+        await self.show_page(interaction, self.offset + self.PAGE_SIZE)
+
+@bot.tree.command(name="search", description="Search past deals and ticket transcripts")
+@app_commands.describe(query="User IDs, exchange type, crypto, amount or words from a transcript")
+async def search_command(interaction: discord.Interaction, query: app_commands.Range[str, 1, 200]):
+    required_role = config_role(interaction.guild, 'staff_role')
+    if not required_role or required_role not in interaction.user.roles:
+        await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
+        return
+    
+    rows = await db.run('search', lambda conn: search(conn.cursor(), interaction.guild.id, query, SearchResultsView.PAGE_SIZE + 1))
+    view = SearchResultsView(query, rows)
+    await interaction.response.send_message(embed=view.build_embed(), view=view, ephemeral=True)
+
 @bot.command(name="warn")
 async def warn_exchanger(ctx, exchanger: discord.Member, *, reason: str):
-    required_role = ctx.guild.get_role(1443936660063518770)
+    required_role = config_role(ctx.guild, 'staff_role')
     if not required_role or required_role not in ctx.author.roles:
         await ctx.send("❌ You don't have permission to use this command!")
         return
@@ -1224,23 +1482,20 @@ async def warn_exchanger(ctx, exchanger: discord.Member, *, reason: str):
     ist = pytz.timezone('Asia/Kolkata')
     warn_date = datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S')
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('INSERT INTO warnings (user_id, reason, warned_by, date) VALUES (?, ?, ?, ?)',
-              (exchanger.id, reason, ctx.author.id, warn_date))
-    warn_id = c.lastrowid
-    
-    c.execute('SELECT COUNT(*) FROM warnings WHERE user_id = ?', (exchanger.id,))
-    warn_count = c.fetchone()[0]
-    
-    if warn_count >= 10 and warn_count % 10 == 0:
-        c.execute('INSERT OR IGNORE INTO fees (user_id, total_fee) VALUES (?, 0)', (exchanger.id,))
-        c.execute('UPDATE fees SET total_fee = total_fee + 1.0 WHERE user_id = ?', (exchanger.id,))
-    
-    conn.commit()
-    conn.close()
+    def add_warning(c):
+        c.execute('INSERT INTO warnings (guild_id, user_id, reason, warned_by, date) VALUES (?, ?, ?, ?, ?)',
+                  (ctx.guild.id, exchanger.id, reason, ctx.author.id, warn_date))
+        warn_id = c.lastrowid
+        
+        c.execute('SELECT COUNT(*) FROM warnings WHERE guild_id = ? AND user_id = ?', (ctx.guild.id, exchanger.id))
+        warn_count = c.fetchone()[0]
+        
+        if warn_count >= 10 and warn_count % 10 == 0:
+            record_fee(c, ctx.guild.id, exchanger.id, WARN_PENALTY, f"Penalty for {warn_count} warnings", ctx.author.id)
+        return warn_id, warn_count
+    warn_id, warn_count = await db.write(add_warning)
     
-    warn_channel = ctx.guild.get_channel(1444217997484101702)
+    warn_channel = config_channel(ctx.guild, 'warn_channel')
     if warn_channel:
         embed = discord.Embed(
             title="⚠️ Warning Issued",
@@ -1262,37 +1517,26 @@ async def warn_exchanger(ctx, exchanger: discord.Member, *, reason: str):
 
 @bot.command(name="removewarn")
 async def remove_warn(ctx, exchanger: discord.Member, warn_id: int):
-    required_role = ctx.guild.get_role(1443936660063518770)
+    required_role = config_role(ctx.guild, 'staff_role')
     if not required_role or required_role not in ctx.author.roles:
         await ctx.send("❌ You don't have permission to use this command!")
         return
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT user_id FROM warnings WHERE id = ? AND user_id = ?', (warn_id, exchanger.id))
-    if not c.fetchone():
+    deleted = await db.execute('DELETE FROM warnings WHERE id = ? AND guild_id = ? AND user_id = ?', (warn_id, ctx.guild.id, exchanger.id))
+    if not deleted:
         await ctx.send(f"❌ Warning ID `{warn_id}` not found for {exchanger.mention}!")
-        conn.close()
         return
     
-    c.execute('DELETE FROM warnings WHERE id = ?', (warn_id,))
-    conn.commit()
-    conn.close()
-    
     await ctx.send(f"✅ Removed warning `{warn_id}` from {exchanger.mention}")
 
 @bot.command(name="clearwarns")
 async def clear_warns(ctx, exchanger: discord.Member):
-    required_role = ctx.guild.get_role(1443936660063518770)
+    required_role = config_role(ctx.guild, 'staff_role')
     if not required_role or required_role not in ctx.author.roles:
         await ctx.send("❌ You don't have permission to use this command!")
         return
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('DELETE FROM warnings WHERE user_id = ?', (exchanger.id,))
-    conn.commit()
-    conn.close()
+    await db.execute('DELETE FROM warnings WHERE guild_id = ? AND user_id = ?', (ctx.guild.id, exchanger.id))
     
     await ctx.send(f"✅ Cleared all warnings for {exchanger.mention}")
 
@@ -1300,11 +1544,7 @@ async def clear_warns(ctx, exchanger: discord.Member):
 async def check_warns(ctx, exchanger: discord.Member = None):
     target = exchanger if exchanger else ctx.author
     
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT id, reason, warned_by, date FROM warnings WHERE user_id = ? ORDER BY id DESC', (target.id,))
-    warnings = c.fetchall()
-    conn.close()
+    warnings = await db.fetchall('SELECT id, reason, warned_by, date FROM warnings WHERE guild_id = ? AND user_id = ? ORDER BY id DESC', (ctx.guild.id, target.id))
     
     if not warnings:
         await ctx.send(f"✅ {target.mention} has no warnings!")
@@ -1317,8 +1557,9 @@ async def check_warns(ctx, exchanger: discord.Member = None):
     )
     embed.set_thumbnail(url=target.display_avatar.url)
     
+    warners = await members.get_many(ctx.guild, [warned_by for _, _, warned_by, _ in warnings[:10] if warned_by])
     for warn_id, reason, warned_by, date in warnings[:10]:
-        warner = await ctx.guild.fetch_member(warned_by) if warned_by else None
+        warner = warners.get(warned_by)
         warner_name = warner.display_name if warner else "Unknown"
         embed.add_field(
             name=f"Warn ID: {warn_id}",
@@ -1335,19 +1576,16 @@ async def check_warns(ctx, exchanger: discord.Member = None):
 @app_commands.describe(user="The user to view profile (leave empty for yourself)")
 async def profile(interaction: discord.Interaction, user: discord.Member = None):
     target_user = user if user else interaction.user
-    conn = sqlite3.connect('exchangers.db')
-    c = conn.cursor()
-    c.execute('SELECT security_holding, exchanger_type, joined_date FROM exchangers WHERE user_id = ?', (target_user.id,))
-    exchanger_result = c.fetchone()
+    exchanger_result = await db.fetchone('SELECT security_holding, exchanger_type, joined_date FROM exchangers WHERE guild_id = ? AND user_id = ?',
+                                     (interaction.guild.id, target_user.id))
     if exchanger_result:
         security_holding, exchanger_type, joined_date = exchanger_result
-        c.execute('SELECT COUNT(*), SUM(amount_usd) FROM trades WHERE exchanger_id = ?', (target_user.id,))
-        stats = c.fetchone()
-        total_exchanges = stats[0] if stats[0] else 0
-        total_usd = stats[1] if stats[1] else 0.0
-        c.execute('SELECT exchange_type, amount_usd, date FROM trades WHERE exchanger_id = ? ORDER BY id DESC LIMIT 5', (target_user.id,))
-        recent_deals = c.fetchall()
-        conn.close()
+        stats = await db.fetchone("SELECT trade_count, volume_usd FROM user_totals WHERE guild_id = ? AND user_id = ? AND role = 'exchanger'",
+                                  (interaction.guild.id, target_user.id))
+        total_exchanges = stats[0] if stats else 0
+        total_usd = stats[1] if stats else 0.0
+        recent_deals = await db.fetchall('SELECT exchange_type, amount_usd, date FROM trades WHERE guild_id = ? AND exchanger_id = ? ORDER BY id DESC LIMIT 5',
+                                        (interaction.guild.id, target_user.id))
         embed = discord.Embed(
             title=f"<:thaila:1425067683300507669> Exchanger Profile - {target_user.display_name}",
             color=discord.Color.gold()
@@ -1374,11 +1612,10 @@ async def profile(interaction: discord.Interaction, user: discord.Member = None)
             embed.add_field(name="<:zyx_GZ_verified:1414987272918405280> Recent 5 Deals", value="No deals yet", inline=False)
         await interaction.response.send_message(embed=embed)
     else:
-        c.execute('SELECT COUNT(*), SUM(amount_usd) FROM trades WHERE client_id = ?', (target_user.id,))
-        stats = c.fetchone()
-        total_exchanges = stats[0] if stats[0] else 0
-        total_usd = stats[1] if stats[1] else 0.0
-        conn.close()
+        stats = await db.fetchone("SELECT trade_count, volume_usd FROM user_totals WHERE guild_id = ? AND user_id = ? AND role = 'client'",
+                                  (interaction.guild.id, target_user.id))
+        total_exchanges = stats[0] if stats else 0
+        total_usd = stats[1] if stats else 0.0
         if total_exchanges == 0:
             await interaction.response.send_message(f"❌ {target_user.mention} has no trading history!", ephemeral=True)
             return
@@ -1398,4 +1635,134 @@ async def profile(interaction: discord.Interaction, user: discord.Member = None)
         embed.add_field(name="Total $ Exchanged", value=f"${total_usd:.2f}", inline=True)
         embed.add_field(name="Highest Role", value=highest_role.mention if highest_role else "None", inline=True)
         await interaction.response.send_message(embed=embed)
-bot.run('')
+
+@bot.tree.command(name="backfilltotals", description="Rebuild client and exchanger totals from the trade history")
+async def backfilltotals(interaction: discord.Interaction):
+    required_role = config_role(interaction.guild, 'admin_role')
+    if not required_role or required_role not in interaction.user.roles:
+        await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
+        return
+    
+    await interaction.response.defer(ephemeral=True)
+    rows = await db.transaction(lambda c: rebuild_user_totals(c, interaction.guild.id), label='rebuild user totals')
+    await interaction.followup.send(f"✅ Rebuilt totals for {rows} client/exchanger entries", ephemeral=True)
+
+@bot.tree.command(name="memberstats", description="Show member lookup cache statistics")
+async def memberstats(interaction: discord.Interaction):
+    required_role = config_role(interaction.guild, 'admin_role')
+    if not required_role or required_role not in interaction.user.roles:
+        await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
+        return
+    
+    stats = members.stats()
+    embed = discord.Embed(title="👥 Member Lookups", color=discord.Color.blue())
+    embed.add_field(name="Gateway Hits", value=str(stats['gateway_hits']), inline=True)
+    embed.add_field(name="Cache Hits", value=str(stats['cache_hits']), inline=True)
+    embed.add_field(name="Misses", value=str(stats['misses']), inline=True)
+    embed.add_field(name="API Calls", value=str(stats['api_calls']), inline=True)
+    embed.add_field(name="Hit Rate", value=f"{stats['hit_rate']:.1f}%", inline=True)
+    embed.add_field(name="Cached Members", value=str(stats['cached']), inline=True)
+    if startup_report:
+        embed.add_field(
+            name="Startup",
+            value=f"> **Chunking:** {startup_report['mode']}\n> **Ready in:** {startup_report['ready_seconds']:.1f}s\n> **Memory at ready:** {startup_report['memory_mb']:.0f} MB\n> **Memory now:** {resident_memory_mb():.0f} MB",
+            inline=False
+        )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="dbstats", description="Show database query timings")
+async def dbstats(interaction: discord.Interaction):
+    required_role = config_role(interaction.guild, 'admin_role')
+    if not required_role or required_role not in interaction.user.roles:
+        await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
+        return
+    
+    slowest = sorted(db.stats.items(), key=lambda item: item[1].wait_total + item[1].exec_total, reverse=True)[:10]
+    if not slowest:
+        await interaction.response.send_message("No queries recorded yet.", ephemeral=True)
+        return
+    
+    embed = discord.Embed(title="🗄️ Database Timings", color=discord.Color.blue())
+    for label, stats in slowest:
+        embed.add_field(
+            name=label[:256],
+            value=f"> **Calls:** {stats.count}\n> **Wait:** {stats.wait_total / stats.count * 1000:.2f}ms avg / {stats.wait_max * 1000:.2f}ms max\n> **Exec:** {stats.exec_total / stats.count * 1000:.2f}ms avg / {stats.exec_max * 1000:.2f}ms max",
+            inline=False
+        )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="setconfig", description="Set a role, channel or category used by the bot in this server")
+@app_commands.describe(key="The setting to change", value="A role/channel mention or ID, or 'none' to clear it")
+@app_commands.choices(key=[app_commands.Choice(name=key, value=key) for key in CONFIG_KEYS])
+async def setconfig(interaction: discord.Interaction, key: str, value: str):
+    # Server administrators may always configure, so a new server can set its admin role first.
+    required_role = config_role(interaction.guild, 'admin_role')
+    if not interaction.user.guild_permissions.administrator and (not required_role or required_role not in interaction.user.roles):
+        await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
+        return
+    
+    if value.lower() == 'none':
+        await guild_configs.set(interaction.guild.id, key, None)
+        await interaction.response.send_message(f"✅ Cleared `{key}`", ephemeral=True)
+        return
+    
+    snowflake = ''.join(ch for ch in value if ch.isdigit())
+    target = None
+    if key.endswith('_role'):
+        kind = 'role'
+        if snowflake:
+            target = interaction.guild.get_role(int(snowflake))
+    else:
+        # Categories hold tickets and channels receive messages, so the wrong type breaks .done halfway through.
+        kind, channel_type = ('category', discord.CategoryChannel) if key.endswith('_category') else ('text channel', discord.TextChannel)
+        if snowflake:
+            target = interaction.guild.get_channel(int(snowflake))
+        if target and not isinstance(target, channel_type):
+            await interaction.response.send_message(f"❌ `{key}` must be a {kind}, but {target.mention} is not one!", ephemeral=True)
+            return
+    if not target:
+        await interaction.response.send_message(f"❌ `{value}` is not a {kind} in this server!", ephemeral=True)
+        return
+    
+    await guild_configs.set(interaction.guild.id, key, target.id)
+    await interaction.response.send_message(f"✅ Set `{key}` to {target.mention}", ephemeral=True)
+
+@bot.tree.command(name="reloadconfig", description="Reload every server's configuration from the database")
+async def reloadconfig(interaction: discord.Interaction):
+    required_role = config_role(interaction.guild, 'admin_role')
+    if not interaction.user.guild_permissions.administrator and (not required_role or required_role not in interaction.user.roles):
+        await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
+        return
+    
+    guilds = await guild_configs.reload()
+    
+    embed = discord.Embed(title="⚙️ Server Configuration", description=f"Reloaded configuration for {guilds} servers", color=discord.Color.blue())
+    config = guild_configs.items(interaction.guild.id)
+    lines = []
+    for key in CONFIG_KEYS:
+        if key in config:
+            lines.append(f"> **{key}:** {'<@&' if key.endswith('_role') else '<#'}{config[key]}>")
+        else:
+            lines.append(f"> **{key}:** not set")
+    embed.add_field(name=interaction.guild.name, value="\n".join(lines), inline=False)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.command(name="sync")
+async def force_sync(ctx):
+    required_role = config_role(ctx.guild, 'admin_role')
+    if not required_role or required_role not in ctx.author.roles:
+        await ctx.send("❌ You don't have permission to use this command!")
+        return
+    
+    try:
+        synced = await sync_command_tree(force=True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to sync commands: {str(e)}")
+        return
+    await ctx.send(f"✅ Synced {len(synced)} commands!")
+
+# Transcript render workers are spawned and import this module, so nothing may
+# start (database, bot) unless it is run as the main script.
+if __name__ == '__main__':
+    init_db()
+    bot.run('')
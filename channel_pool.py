@@ -0,0 +1,78 @@
+import time
+from collections import deque
+
+import discord
+
+
+class TicketChannelPool:
+    """Hidden, pre-created ticket channels per category, handed out on confirm.
+
+    Taking a pooled channel costs one ``channel.edit`` (name and overwrites
+    together) instead of a ``create_text_channel`` call. Pooled channels are
+    recognised by their name prefix, so they are adopted again after a restart.
+    """
+
+    def __init__(self, watermark=2, quiet=60.0, prefix='pool-'):
+        self.watermark = watermark
+        self.quiet = quiet
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self._pools = {}
+        self._last_take = 0.0
+
+    def _pool(self, category_id):
+        return self._pools.setdefault(category_id, deque())
+
+    def adopt(self, category, is_free):
+        pool = self._pool(category.id)
+        known = {channel.id for channel in pool}
+        for channel in category.text_channels:
+            if channel.name.startswith(self.prefix) and channel.id not in known and is_free(channel):
+                pool.append(channel)
+
+    def discard(self, channel):
+        pool = self._pools.get(getattr(channel, 'category_id', None))
+        if pool and channel in pool:
+            pool.remove(channel)
+
+    def available(self, category_id):
+        return len(self._pools.get(category_id, ()))
+
+    async def take(self, category, name, overwrites):
+        """Return a pooled channel renamed and opened up with ``overwrites``, or None if none could be used."""
+        self._last_take = time.monotonic()
+        pool = self._pools.get(category.id)
+        while pool:
+            channel = pool.popleft()
+            try:
+                await channel.edit(name=name, overwrites=overwrites)
+            except discord.NotFound:
+                continue
+            except (discord.HTTPException, discord.RateLimited) as e:
+                # The channel is still hidden and usable later; let the caller create one now instead.
+                print(f'Could not open pooled channel #{channel.name}: {e}')
+                pool.append(channel)
+                break
+            self.hits += 1
+            return channel
+        self.misses += 1
+        return None
+
+    def is_quiet(self):
+        return time.monotonic() - self._last_take >= self.quiet
+
+    async def refill(self, category, key):
+        """Create at most one channel in ``category`` if it is below the watermark; returns True if it did."""
+        pool = self._pool(category.id)
+        if len(pool) >= self.watermark:
+            return False
+        channel = await category.guild.create_text_channel(
+            name=f'{self.prefix}{key.lower()}',
+            category=category,
+            overwrites={category.guild.default_role: discord.PermissionOverwrite(read_messages=False)}
+        )
+        pool.append(channel)
+        self.created += 1
+        return True
@@ -0,0 +1,220 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import span
+
+
+class QueryStats:
+    __slots__ = ('count', 'wait_total', 'exec_total', 'wait_max', 'exec_max')
+
+    def __init__(self):
+        self.count = 0
+        self.wait_total = 0.0
+        self.exec_total = 0.0
+        self.wait_max = 0.0
+        self.exec_max = 0.0
+
+    def add(self, wait, elapsed):
+        self.count += 1
+        self.wait_total += wait
+        self.exec_total += elapsed
+        self.wait_max = max(self.wait_max, wait)
+        self.exec_max = max(self.exec_max, elapsed)
+
+
+class Database:
+    """One long-lived WAL connection, driven from a single worker thread.
+
+    Every query is submitted to the worker so the event loop never blocks on
+    SQLite. Because the worker is the only thread touching the connection,
+    the time a job sits in the executor queue is the time it waited for the
+    connection, and it is reported separately from the execution time.
+
+    Once start_writer() has been called, write() hands mutations to a
+    background task that commits everything queued within a few milliseconds
+    in one transaction, so a burst of writes costs one fsync instead of one
+    per command.
+    """
+
+    def __init__(self, path, slow_query_ms=250):
+        self.path = path
+        self.slow_query_ms = slow_query_ms
+        self.stats = {}
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+        self._queue = None
+        self._writer = None
+
+    def connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # FULL fsyncs the WAL on every commit, so a resolved write survives a power loss;
+            # group commit keeps that to one fsync per batch.
+            conn.execute('PRAGMA synchronous=FULL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            self._conn = conn
+        return self._conn
+
+    async def close(self):
+        if self._writer is not None:
+            # The writer commits whatever is already queued, then stops at the sentinel.
+            self._queue.put_nowait(None)
+            await self._writer
+            self._writer = None
+        if self._conn is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._close_connection)
+        self._executor.shutdown(wait=True)
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _record(self, label, wait, elapsed):
+        stats = self.stats.get(label)
+        if stats is None:
+            stats = self.stats[label] = QueryStats()
+        stats.add(wait, elapsed)
+        if (wait + elapsed) * 1000 >= self.slow_query_ms:
+            print(f'Slow query ({wait * 1000:.1f}ms wait, {elapsed * 1000:.1f}ms exec): {label}')
+
+    async def run(self, label, fn, *args):
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        timings = []
+
+        def job():
+            started = time.perf_counter()
+            try:
+                return fn(self.connect(), *args)
+            finally:
+                timings.append((started, time.perf_counter()))
+
+        with span('db', label=label) as s:
+            try:
+                return await loop.run_in_executor(self._executor, job)
+            finally:
+                if timings:
+                    started, finished = timings[0]
+                    self._record(label, started - submitted, finished - started)
+                    s.set(wait_ms=round((started - submitted) * 1000, 2), exec_ms=round((finished - started) * 1000, 2))
+
+    async def execute(self, sql, params=()):
+        return await self.write(lambda c: c.execute(sql, params).rowcount, label=_label(sql))
+
+    async def executemany(self, sql, seq_of_params):
+        return await self.write(lambda c: c.executemany(sql, seq_of_params).rowcount, label=_label(sql))
+
+    async def fetchone(self, sql, params=()):
+        return await self.run(_label(sql), _fetchone, sql, params)
+
+    async def fetchall(self, sql, params=()):
+        return await self.run(_label(sql), _fetchall, sql, params)
+
+    async def transaction(self, fn, label=None):
+        return await self.run(label or getattr(fn, '__name__', 'transaction'), _transaction, fn)
+
+    def start_writer(self, flush_interval=0.005, max_batch=64):
+        if self._writer is None:
+            self.flush_interval = flush_interval
+            self.max_batch = max_batch
+            self._queue = asyncio.Queue()
+            self._writer = asyncio.create_task(self._write_loop())
+
+    async def write(self, fn, label=None):
+        label = label or getattr(fn, '__name__', 'write')
+        if self._writer is None:
+            return await self.transaction(fn, label)
+        future = asyncio.get_running_loop().create_future()
+        with span('db write', label=label) as s:
+            self._queue.put_nowait((fn, label, future, time.perf_counter(), s))
+            return await future
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            op = await self._queue.get()
+            if op is None:
+                return
+            batch = [op]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    op = self._queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        op = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if op is None:
+                    closing = True
+                    break
+                batch.append(op)
+
+            flush_started = time.perf_counter()
+            try:
+                results = await self.run('group commit', _group_commit, [op[0] for op in batch])
+            except Exception as e:
+                results = [(False, e)] * len(batch)
+            flushed = time.perf_counter()
+            for (fn, label, future, queued, s), (ok, value) in zip(batch, results):
+                self._record(label, flush_started - queued, flushed - flush_started)
+                s.set(wait_ms=round((flush_started - queued) * 1000, 2), exec_ms=round((flushed - flush_started) * 1000, 2),
+                      batch=len(batch))
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+
+def _label(sql):
+    return ' '.join(sql.split())[:80]
+
+
+def _fetchone(conn, sql, params):
+    return conn.execute(sql, params).fetchone()
+
+
+def _fetchall(conn, sql, params):
+    return conn.execute(sql, params).fetchall()
+
+
+def _group_commit(conn, fns):
+    # Each mutation runs in its own savepoint so one failing write does not sink the rest of the batch.
+    results = []
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for fn in fns:
+            conn.execute('SAVEPOINT op')
+            try:
+                results.append((True, fn(conn.cursor())))
+            except Exception as e:
+                conn.execute('ROLLBACK TO op')
+                results.append((False, e))
+            conn.execute('RELEASE op')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+    return results
+
+
+def _transaction(conn, fn):
+    c = conn.cursor()
+    c.execute('BEGIN IMMEDIATE')
+    try:
+        result = fn(c)
+    except BaseException:
+        c.execute('ROLLBACK')
+        raise
+    c.execute('COMMIT')
+    return result
@@ -0,0 +1,45 @@
+from datetime import datetime
+import pytz
+
+FEE_PER_DEAL = 0.025
+WARN_PENALTY = 1.0
+
+
+def record_fee(c, guild_id, user_id, amount, reason, actor_id=None):
+    ist = pytz.timezone('Asia/Kolkata')
+    c.execute('INSERT INTO fee_events (guild_id, user_id, amount, reason, actor_id, date) VALUES (?, ?, ?, ?, ?, ?)',
+              (guild_id, user_id, amount, reason, actor_id, datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S')))
+    return c.lastrowid
+
+
+def fee_balance(c, guild_id, user_id):
+    # Snapshot plus whatever was appended since the last compaction.
+    c.execute('''SELECT COALESCE(b.balance, 0) + COALESCE((SELECT SUM(e.amount) FROM fee_events e
+                                                           WHERE e.guild_id = u.guild_id AND e.user_id = u.user_id
+                                                           AND e.id > COALESCE(b.last_event_id, 0)), 0)
+                 FROM (SELECT ? AS guild_id, ? AS user_id) u
+                 LEFT JOIN fee_balances b ON b.guild_id = u.guild_id AND b.user_id = u.user_id''',
+              (guild_id, user_id))
+    return c.fetchone()[0]
+
+
+def compact_fees(c):
+    # Every compaction folds all events up to the current maximum id, so the
+    # largest last_event_id is a watermark below which nothing is left in the tail.
+    c.execute('SELECT COALESCE(MAX(last_event_id), 0) FROM fee_balances')
+    watermark = c.fetchone()[0]
+    c.execute('''INSERT INTO fee_balances (guild_id, user_id, balance, last_event_id)
+                 SELECT guild_id, user_id, SUM(amount), MAX(id) FROM fee_events WHERE id > ? GROUP BY guild_id, user_id
+                 ON CONFLICT (guild_id, user_id) DO UPDATE SET balance = balance + excluded.balance, last_event_id = excluded.last_event_id''',
+              (watermark,))
+    return c.rowcount
+
+
+def fee_statement(c, guild_id, user_id, before_id=None, after_id=None, limit=10):
+    if after_id is not None:
+        c.execute('SELECT id, amount, reason, actor_id, date FROM fee_events WHERE guild_id = ? AND user_id = ? AND id > ? ORDER BY id ASC LIMIT ?',
+                  (guild_id, user_id, after_id, limit))
+        return c.fetchall()[::-1]
+    c.execute('SELECT id, amount, reason, actor_id, date FROM fee_events WHERE guild_id = ? AND user_id = ? AND id < ? ORDER BY id DESC LIMIT ?',
+              (guild_id, user_id, before_id if before_id is not None else 2 ** 63 - 1, limit))
+    return c.fetchall()
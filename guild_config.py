@@ -0,0 +1,66 @@
+# The original server's IDs; seeded as its guild_config when its legacy rows are claimed.
+DEFAULT_CONFIG = {
+    'admin_role': 1443936237349240872,
+    'staff_role': 1443936660063518770,
+    'exchanger_role': 1443936662018068500,
+    'client_tier1_role': 1443937345849135224,
+    'client_tier2_role': 1443937344808816680,
+    'client_tier3_role': 1443936664035659819,
+    'client_tier4_role': 1443936663947579402,
+    'exchanger_tier1_role': 1443936661250642021,
+    'exchanger_tier2_role': 1443936660680216688,
+    'log_channel': 1444179898737361109,
+    'public_log_channel': 1444222323124342945,
+    'transcript_channel': 1444225280397938850,
+    'feedback_channel': 1443940712482869440,
+    'warn_channel': 1444217997484101702,
+    'i2c_category': 1444172151237378088,
+    'c2i_category': 1444172197164748851,
+    'n2c_category': 1444172222846603346,
+    'c2n_category': 1444172246255145111
+}
+CONFIG_KEYS = tuple(DEFAULT_CONFIG)
+
+
+class GuildConfigCache:
+    """In-memory copy of guild_config, one dict of snowflakes per guild.
+
+    Handlers read from here on every call; `reload` re-reads the table so
+    edits made outside the bot take effect without a restart.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._configs = {}
+
+    def hydrate(self, conn):
+        self.replace(self.load(conn))
+
+    def load(self, conn):
+        return conn.execute('SELECT guild_id, key, value FROM guild_config').fetchall()
+
+    def replace(self, rows):
+        configs = {}
+        for guild_id, key, value in rows:
+            configs.setdefault(guild_id, {})[key] = value
+        self._configs = configs
+
+    async def reload(self):
+        self.replace(await self.db.run('guild config reload', self.load))
+        return len(self._configs)
+
+    def get(self, guild_id, key):
+        return self._configs.get(guild_id, {}).get(key)
+
+    def items(self, guild_id):
+        return dict(self._configs.get(guild_id, {}))
+
+    async def set(self, guild_id, key, value):
+        if value is None:
+            await self.db.execute('DELETE FROM guild_config WHERE guild_id = ? AND key = ?', (guild_id, key))
+            self._configs.get(guild_id, {}).pop(key, None)
+            return
+        await self.db.execute('''INSERT INTO guild_config (guild_id, key, value) VALUES (?, ?, ?)
+                                 ON CONFLICT (guild_id, key) DO UPDATE SET value = excluded.value''',
+                              (guild_id, key, value))
+        self._configs.setdefault(guild_id, {})[key] = value
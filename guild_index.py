@@ -0,0 +1,65 @@
+import discord
+
+
+class GuildIndex:
+    __slots__ = ('roles_by_id', 'roles_by_name', 'categories_by_id', 'categories_by_name')
+
+    def __init__(self, guild):
+        self.rebuild_roles(guild)
+        self.rebuild_categories(guild)
+
+    def rebuild_roles(self, guild):
+        self.roles_by_id = {role.id: role for role in guild.roles}
+        self.roles_by_name = {}
+        # guild.roles is in position order; keep the first match like discord.utils.get does.
+        for role in guild.roles:
+            self.roles_by_name.setdefault(role.name, role)
+
+    def rebuild_categories(self, guild):
+        self.categories_by_id = {category.id: category for category in guild.categories}
+        self.categories_by_name = {}
+        for category in guild.categories:
+            self.categories_by_name.setdefault(category.name, category)
+
+
+class GuildIndexes:
+    """Name and ID lookups for roles and categories, one index per guild.
+
+    Built on ready and rebuilt for the affected guild by the role and channel
+    events, which are rare compared to the lookups done by every ticket.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+
+    def build(self, guild):
+        self._indexes[guild.id] = GuildIndex(guild)
+
+    def forget(self, guild):
+        self._indexes.pop(guild.id, None)
+
+    def _get(self, guild):
+        index = self._indexes.get(guild.id)
+        if index is None:
+            index = self._indexes[guild.id] = GuildIndex(guild)
+        return index
+
+    def role(self, guild, key):
+        index = self._get(guild)
+        if isinstance(key, int):
+            return index.roles_by_id.get(key)
+        return index.roles_by_name.get(key)
+
+    def category(self, guild, key):
+        index = self._get(guild)
+        if isinstance(key, int):
+            return index.categories_by_id.get(key)
+        return index.categories_by_name.get(key)
+
+    def roles_changed(self, guild):
+        if guild.id in self._indexes:
+            self._indexes[guild.id].rebuild_roles(guild)
+
+    def channels_changed(self, channel):
+        if isinstance(channel, discord.CategoryChannel) and channel.guild.id in self._indexes:
+            self._indexes[channel.guild.id].rebuild_categories(channel.guild)
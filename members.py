@@ -0,0 +1,97 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import discord
+
+
+class MemberResolver:
+    """Resolves members from the gateway cache first, then a bounded TTL cache, then the API.
+
+    Several misses in the same guild are batched into one gateway
+    query_members request instead of one REST fetch_member each. With
+    ``cache_members=False`` the results stay out of the gateway cache, so
+    the LRU here is the only (bounded) place they are kept.
+    """
+
+    def __init__(self, max_size=2048, ttl=600, cache_members=True):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache_members = cache_members
+        self._cache = OrderedDict()
+        self.gateway_hits = 0
+        self.cache_hits = 0
+        self.misses = 0
+        self.api_calls = 0
+
+    def remember(self, member):
+        key = (member.guild.id, member.id)
+        self._cache[key] = (member, time.monotonic() + self.ttl)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def forget(self, guild_id, user_id):
+        self._cache.pop((guild_id, user_id), None)
+
+    def _lookup(self, guild, user_id):
+        member = guild.get_member(user_id)
+        if member is not None:
+            self.gateway_hits += 1
+            return member
+        key = (guild.id, user_id)
+        entry = self._cache.get(key)
+        if entry is not None:
+            member, expires = entry
+            if expires > time.monotonic():
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return member
+            del self._cache[key]
+        return None
+
+    async def get(self, guild, user_id):
+        return (await self.get_many(guild, [user_id])).get(user_id)
+
+    async def get_many(self, guild, user_ids):
+        found = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            member = self._lookup(guild, user_id)
+            if member is not None:
+                found[user_id] = member
+            else:
+                missing.append(user_id)
+        if not missing:
+            return found
+
+        self.misses += len(missing)
+        for start in range(0, len(missing), 100):
+            batch = missing[start:start + 100]
+            self.api_calls += 1
+            try:
+                members = await guild.query_members(user_ids=batch, limit=len(batch), cache=self.cache_members)
+            except (discord.ClientException, discord.HTTPException, asyncio.TimeoutError):
+                members = []
+                for user_id in batch:
+                    self.api_calls += 1
+                    try:
+                        members.append(await guild.fetch_member(user_id))
+                    except discord.NotFound:
+                        pass
+            for member in members:
+                self.remember(member)
+                found[member.id] = member
+        return found
+
+    def stats(self):
+        lookups = self.gateway_hits + self.cache_hits + self.misses
+        hit_rate = (self.gateway_hits + self.cache_hits) / lookups * 100 if lookups else 0.0
+        return {
+            'gateway_hits': self.gateway_hits,
+            'cache_hits': self.cache_hits,
+            'misses': self.misses,
+            'api_calls': self.api_calls,
+            'hit_rate': hit_rate,
+            'cached': len(self._cache)
+        }
@@ -0,0 +1,195 @@
+import asyncio
+import bisect
+import re
+import time
+
+import aiohttp
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_SNOWFLAKE = re.compile(r'/\d{15,}')
+# Interaction and webhook tokens (and reaction emoji) would give every request its own route.
+_TOKEN = re.compile(r'/(webhooks|interactions)/\{id\}/[^/]+')
+_EMOJI = re.compile(r'/reactions/[^/]+')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        self._values[tuple(labels[name] for name in self.labels)] = value
+
+    def clear(self):
+        self._values = {}
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} {self.kind}'
+        for key, value in self._values.items():
+            yield f'{self.name}{_labels(self.labels, key)} {value}'
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += 1
+        series[2] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for key, (counts, count, total) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket{_labels(self.labels, key, (("le", bound),))} {cumulative}'
+            yield f'{self.name}_bucket{_labels(self.labels, key, (("le", "+Inf"),))} {count}'
+            yield f'{self.name}_sum{_labels(self.labels, key)} {total}'
+            yield f'{self.name}_count{_labels(self.labels, key)} {count}'
+
+
+class MetricsRegistry:
+    """Prometheus text-format metrics, served from the bot's own event loop.
+
+    Metrics that are cheaper to read than to track (gauges over the ticket
+    registry, the database's own timings) are filled in by collectors that
+    run on every scrape.
+    """
+
+    def __init__(self, prefix='exchange_bot'):
+        self.prefix = prefix
+        self._metrics = []
+        self._collectors = []
+        self._runner = None
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(f'{self.prefix}_{name}', help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Gauge(f'{self.prefix}_{name}', help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(f'{self.prefix}_{name}', help, labels, buckets))
+
+    def collector(self, fn):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f'Metrics collector {collect.__name__} failed: {e!r}')
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    async def _handle(self, request):
+        return web.Response(text=self.render(), content_type='text/plain', charset='utf-8')
+
+    async def serve(self, host='127.0.0.1', port=9100):
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        print(f'Serving metrics on http://{host}:{port}/metrics')
+
+
+def http_trace(registry):
+    """aiohttp TraceConfig that counts and times every Discord REST call by method, route and status."""
+    requests = registry.histogram('discord_http_request_seconds', 'Discord REST request latency', ('method', 'route', 'status'))
+    rate_limits = registry.counter('discord_http_429_total', 'Discord REST responses with status 429', ('method', 'route'))
+
+    def route(url):
+        path = _SNOWFLAKE.sub('/{id}', url.path)
+        return _EMOJI.sub('/reactions/{emoji}', _TOKEN.sub(r'/\1/{id}/{token}', path))
+
+    async def on_request_start(session, ctx, params):
+        ctx.started = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        if '/api/' not in params.url.path:
+            return
+        path = route(params.url)
+        requests.observe(time.perf_counter() - ctx.started, method=params.method, route=path, status=params.response.status)
+        if params.response.status == 429:
+            rate_limits.inc(method=params.method, route=path)
+
+    async def on_request_exception(session, ctx, params):
+        if '/api/' in params.url.path:
+            requests.observe(time.perf_counter() - ctx.started, method=params.method, route=route(params.url), status='error')
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    return trace
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic wake-up runs, i.e. how long the event loop was blocked."""
+
+    def __init__(self, registry, interval=0.5):
+        self.interval = interval
+        self.lag = registry.histogram('event_loop_lag_seconds', 'Delay of a scheduled wake-up on the event loop',
+                                      buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+        self.current = registry.gauge('event_loop_lag_last_seconds', 'Most recent event loop lag sample')
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.lag.observe(lag)
+            self.current.set(lag)
@@ -0,0 +1,314 @@
+from datetime import datetime, timezone
+
+
+def _initial_schema(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS exchangers
+                 (user_id INTEGER PRIMARY KEY, security_holding REAL, exchanger_type TEXT, joined_date TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS rates
+                 (type TEXT PRIMARY KEY, rate REAL)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS trades
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  exchanger_id INTEGER,
+                  client_id INTEGER,
+                  exchange_type TEXT,
+                  amount_usd REAL,
+                  crypto TEXT,
+                  date TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS active_tickets
+                 (channel_id INTEGER PRIMARY KEY,
+                  client_id INTEGER,
+                  exchanger_id INTEGER,
+                  exchange_type TEXT,
+                  claim_time TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS fees
+                 (user_id INTEGER PRIMARY KEY,
+                  total_fee REAL DEFAULT 0)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS warnings
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id INTEGER,
+                  reason TEXT,
+                  warned_by INTEGER,
+                  date TEXT)''')
+
+    # Databases created before claim_time existed still have the old active_tickets layout.
+    if 'claim_time' not in _columns(c, 'active_tickets'):
+        c.execute('ALTER TABLE active_tickets ADD COLUMN claim_time TEXT')
+
+    for ex_type in ['I2C', 'C2I', 'N2C', 'C2N']:
+        c.execute('INSERT OR IGNORE INTO rates VALUES (?, ?)', (ex_type, 1.0))
+
+
+def _lookup_indexes(c):
+    # Covers the profile "recent deals" query and the per-exchanger COUNT/SUM without touching the table.
+    c.execute('CREATE INDEX IF NOT EXISTS idx_trades_exchanger ON trades (exchanger_id, id DESC, exchange_type, amount_usd, date)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_trades_client ON trades (client_id, amount_usd)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_active_tickets_client ON active_tickets (client_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_active_tickets_exchanger ON active_tickets (exchanger_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_warnings_user ON warnings (user_id, id DESC)')
+
+
+def _ticket_details(c):
+    # Tickets opened before this migration keep NULLs here and fall back to parsing their embed.
+    c.execute('ALTER TABLE active_tickets ADD COLUMN amount_usd REAL')
+    c.execute('ALTER TABLE active_tickets ADD COLUMN amount_local REAL')
+    c.execute('ALTER TABLE active_tickets ADD COLUMN crypto TEXT')
+    c.execute('ALTER TABLE active_tickets ADD COLUMN rate REAL')
+
+
+def _user_totals(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS user_totals
+                 (user_id INTEGER,
+                  role TEXT,
+                  trade_count INTEGER DEFAULT 0,
+                  volume_usd REAL DEFAULT 0,
+                  PRIMARY KEY (user_id, role))''')
+    rebuild_user_totals(c)
+
+
+def _unique_ticket_owners(c):
+    # One open ticket per client and one claimed ticket per exchanger, enforced by SQLite as well as the registry.
+    # The races these indexes close may already have left duplicates behind, which would fail the index builds.
+    # An exchanger keeps their newest claim; the older tickets go back to unclaimed.
+    c.execute('''UPDATE active_tickets SET exchanger_id = NULL, claim_time = NULL WHERE channel_id IN
+                 (SELECT channel_id FROM
+                     (SELECT channel_id, ROW_NUMBER() OVER (PARTITION BY exchanger_id ORDER BY claim_time DESC, channel_id DESC) AS n
+                      FROM active_tickets WHERE exchanger_id IS NOT NULL)
+                  WHERE n > 1)''')
+    unclaimed = c.rowcount
+    # A client keeps their newest ticket in the registry. The older ones lose their stored details and,
+    # like tickets opened before migration 3, are read back from the ticket embed.
+    c.execute('''UPDATE active_tickets SET client_id = NULL, amount_usd = NULL, amount_local = NULL, crypto = NULL, rate = NULL
+                 WHERE channel_id IN
+                 (SELECT channel_id FROM
+                     (SELECT channel_id, ROW_NUMBER() OVER (PARTITION BY client_id ORDER BY channel_id DESC) AS n
+                      FROM active_tickets WHERE client_id IS NOT NULL)
+                  WHERE n > 1)''')
+    detached = c.rowcount
+    if unclaimed or detached:
+        print(f'Resolved duplicate ticket owners: {unclaimed} claim(s) released, {detached} older client ticket(s) detached')
+    c.execute('DROP INDEX IF EXISTS idx_active_tickets_client')
+    c.execute('DROP INDEX IF EXISTS idx_active_tickets_exchanger')
+    c.execute('CREATE UNIQUE INDEX idx_active_tickets_client ON active_tickets (client_id) WHERE client_id IS NOT NULL')
+    c.execute('CREATE UNIQUE INDEX idx_active_tickets_exchanger ON active_tickets (exchanger_id) WHERE exchanger_id IS NOT NULL')
+
+
+def _fee_ledger(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS fee_events
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id INTEGER,
+                  amount REAL,
+                  reason TEXT,
+                  actor_id INTEGER,
+                  date TEXT)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_fee_events_user ON fee_events (user_id, id)')
+    c.execute('''CREATE TABLE IF NOT EXISTS fee_balances
+                 (user_id INTEGER PRIMARY KEY,
+                  balance REAL DEFAULT 0,
+                  last_event_id INTEGER DEFAULT 0)''')
+    # Carry the old mutable balances over as opening entries in the ledger.
+    c.execute('''INSERT INTO fee_events (user_id, amount, reason, date)
+                 SELECT user_id, total_fee, 'Opening balance', datetime('now', '+5 hours', '+30 minutes') FROM fees WHERE total_fee != 0''')
+    c.execute('DROP TABLE fees')
+
+
+def _transcript_archive(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS transcripts
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  channel_id INTEGER,
+                  channel_name TEXT,
+                  client_id INTEGER,
+                  exchanger_id INTEGER,
+                  closed_by INTEGER,
+                  sha256 TEXT,
+                  size INTEGER,
+                  compressed_size INTEGER,
+                  message_url TEXT,
+                  date TEXT)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_transcripts_channel ON transcripts (channel_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_transcripts_sha256 ON transcripts (sha256)')
+
+
+def _search_index(c):
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5
+                 (kind UNINDEXED,
+                  ref_id UNINDEXED,
+                  date UNINDEXED,
+                  people,
+                  exchange_type,
+                  crypto,
+                  amount,
+                  title,
+                  body,
+                  tokenize = 'unicode61')''')
+    # Matches on user IDs, type and crypto outrank matches buried in transcript text.
+    c.execute("INSERT INTO search_index (search_index, rank) VALUES ('rank', 'bm25(0, 0, 0, 10.0, 5.0, 5.0, 5.0, 2.0, 1.0)')")
+    c.execute('''INSERT INTO search_index (kind, ref_id, date, people, exchange_type, crypto, amount, title, body)
+                 SELECT 'trade', id, date, client_id || ' ' || exchanger_id, exchange_type, COALESCE(crypto, ''),
+                        printf('%.2f', amount_usd), '', '' FROM trades''')
+    c.execute('''INSERT INTO search_index (kind, ref_id, date, people, exchange_type, crypto, amount, title, body)
+                 SELECT 'transcript', id, date, TRIM(COALESCE(client_id, '') || ' ' || COALESCE(exchanger_id, '')), '', '', '',
+                        channel_name, '' FROM transcripts''')
+
+
+def _trade_amount_local(c):
+    # Lets the vouch button rebuild its text from the trade row alone.
+    if 'amount_local' not in _columns(c, 'trades'):
+        c.execute('ALTER TABLE trades ADD COLUMN amount_local REAL')
+
+
+def _bot_meta(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS meta
+                 (key TEXT PRIMARY KEY,
+                  value TEXT)''')
+
+
+def _guild_scoping(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS guild_config
+                 (guild_id INTEGER,
+                  key TEXT,
+                  value INTEGER,
+                  PRIMARY KEY (guild_id, key))''')
+
+    # Existing rows all belong to the original server; they stay at guild_id 0
+    # until claim_legacy_rows runs for it on the first ready.
+    for table in ('trades', 'warnings', 'fee_events', 'active_tickets', 'transcripts'):
+        c.execute(f'ALTER TABLE {table} ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0')
+
+    # Tables whose primary key has to include guild_id are rebuilt.
+    c.execute('''CREATE TABLE exchangers_new
+                 (guild_id INTEGER NOT NULL DEFAULT 0, user_id INTEGER, security_holding REAL, exchanger_type TEXT, joined_date TEXT,
+                  PRIMARY KEY (guild_id, user_id))''')
+    c.execute('INSERT INTO exchangers_new SELECT 0, user_id, security_holding, exchanger_type, joined_date FROM exchangers')
+    c.execute('''CREATE TABLE rates_new
+                 (guild_id INTEGER NOT NULL DEFAULT 0, type TEXT, rate REAL,
+                  PRIMARY KEY (guild_id, type))''')
+    c.execute('INSERT INTO rates_new SELECT 0, type, rate FROM rates')
+    c.execute('''CREATE TABLE user_totals_new
+                 (guild_id INTEGER NOT NULL DEFAULT 0,
+                  user_id INTEGER,
+                  role TEXT,
+                  trade_count INTEGER DEFAULT 0,
+                  volume_usd REAL DEFAULT 0,
+                  PRIMARY KEY (guild_id, user_id, role))''')
+    c.execute('INSERT INTO user_totals_new SELECT 0, user_id, role, trade_count, volume_usd FROM user_totals')
+    c.execute('''CREATE TABLE fee_balances_new
+                 (guild_id INTEGER NOT NULL DEFAULT 0,
+                  user_id INTEGER,
+                  balance REAL DEFAULT 0,
+                  last_event_id INTEGER DEFAULT 0,
+                  PRIMARY KEY (guild_id, user_id))''')
+    c.execute('INSERT INTO fee_balances_new SELECT 0, user_id, balance, last_event_id FROM fee_balances')
+    for table in ('exchangers', 'rates', 'user_totals', 'fee_balances'):
+        c.execute(f'DROP TABLE {table}')
+        c.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+
+    c.execute('DROP INDEX IF EXISTS idx_trades_exchanger')
+    c.execute('DROP INDEX IF EXISTS idx_trades_client')
+    c.execute('DROP INDEX IF EXISTS idx_warnings_user')
+    c.execute('DROP INDEX IF EXISTS idx_fee_events_user')
+    c.execute('DROP INDEX IF EXISTS idx_active_tickets_client')
+    c.execute('DROP INDEX IF EXISTS idx_active_tickets_exchanger')
+    c.execute('CREATE INDEX idx_trades_exchanger ON trades (guild_id, exchanger_id, id DESC, exchange_type, amount_usd, date)')
+    c.execute('CREATE INDEX idx_trades_client ON trades (guild_id, client_id, amount_usd)')
+    c.execute('CREATE INDEX idx_warnings_user ON warnings (guild_id, user_id, id DESC)')
+    c.execute('CREATE INDEX idx_fee_events_user ON fee_events (guild_id, user_id, id)')
+    c.execute('CREATE UNIQUE INDEX idx_active_tickets_client ON active_tickets (guild_id, client_id) WHERE client_id IS NOT NULL')
+    c.execute('CREATE UNIQUE INDEX idx_active_tickets_exchanger ON active_tickets (guild_id, exchanger_id) WHERE exchanger_id IS NOT NULL')
+
+    c.execute('''CREATE VIRTUAL TABLE search_index_new USING fts5
+                 (guild_id UNINDEXED,
+                  kind UNINDEXED,
+                  ref_id UNINDEXED,
+                  date UNINDEXED,
+                  people,
+                  exchange_type,
+                  crypto,
+                  amount,
+                  title,
+                  body,
+                  tokenize = 'unicode61')''')
+    c.execute("INSERT INTO search_index_new (search_index_new, rank) VALUES ('rank', 'bm25(0, 0, 0, 0, 10.0, 5.0, 5.0, 5.0, 2.0, 1.0)')")
+    c.execute('''INSERT INTO search_index_new (guild_id, kind, ref_id, date, people, exchange_type, crypto, amount, title, body)
+                 SELECT 0, kind, ref_id, date, people, exchange_type, crypto, amount, title, body FROM search_index''')
+    c.execute('DROP TABLE search_index')
+    c.execute('ALTER TABLE search_index_new RENAME TO search_index')
+
+
+MIGRATIONS = [
+    (1, _initial_schema),
+    (2, _lookup_indexes),
+    (3, _ticket_details),
+    (4, _user_totals),
+    (5, _unique_ticket_owners),
+    (6, _fee_ledger),
+    (7, _transcript_archive),
+    (8, _search_index),
+    (9, _trade_amount_local),
+    (10, _bot_meta),
+    (11, _guild_scoping),
+]
+
+
+def rebuild_user_totals(c, guild_id=None):
+    # Before migration 11 neither table has a guild_id column.
+    if guild_id is None:
+        c.execute('DELETE FROM user_totals')
+        c.execute('''INSERT INTO user_totals (user_id, role, trade_count, volume_usd)
+                     SELECT client_id, 'client', COUNT(*), COALESCE(SUM(amount_usd), 0) FROM trades GROUP BY client_id''')
+        c.execute('''INSERT INTO user_totals (user_id, role, trade_count, volume_usd)
+                     SELECT exchanger_id, 'exchanger', COUNT(*), COALESCE(SUM(amount_usd), 0) FROM trades GROUP BY exchanger_id''')
+        c.execute('SELECT COUNT(*) FROM user_totals')
+        return c.fetchone()[0]
+    c.execute('DELETE FROM user_totals WHERE guild_id = ?', (guild_id,))
+    c.execute('''INSERT INTO user_totals (guild_id, user_id, role, trade_count, volume_usd)
+                 SELECT guild_id, client_id, 'client', COUNT(*), COALESCE(SUM(amount_usd), 0) FROM trades WHERE guild_id = ? GROUP BY client_id''',
+              (guild_id,))
+    c.execute('''INSERT INTO user_totals (guild_id, user_id, role, trade_count, volume_usd)
+                 SELECT guild_id, exchanger_id, 'exchanger', COUNT(*), COALESCE(SUM(amount_usd), 0) FROM trades WHERE guild_id = ? GROUP BY exchanger_id''',
+              (guild_id,))
+    c.execute('SELECT COUNT(*) FROM user_totals WHERE guild_id = ?', (guild_id,))
+    return c.fetchone()[0]
+
+
+GUILD_TABLES = ('exchangers', 'rates', 'trades', 'warnings', 'fee_events', 'fee_balances', 'user_totals',
+                'active_tickets', 'transcripts', 'search_index')
+
+
+def claim_legacy_rows(c, guild_id, config):
+    # Hands the rows migrated from the single-server layout (guild_id 0) to that server.
+    claimed = 0
+    for table in GUILD_TABLES:
+        c.execute(f'UPDATE {table} SET guild_id = ? WHERE guild_id = 0', (guild_id,))
+        claimed += c.rowcount
+    c.executemany('INSERT OR IGNORE INTO guild_config (guild_id, key, value) VALUES (?, ?, ?)',
+                  [(guild_id, key, value) for key, value in config.items()])
+    c.execute("INSERT INTO meta (key, value) VALUES ('legacy_guild_id', ?)", (guild_id,))
+    return claimed
+
+
+def _columns(c, table):
+    return {row[1] for row in c.execute(f'PRAGMA table_info({table})').fetchall()}
+
+
+def migrate(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                    (version INTEGER PRIMARY KEY,
+                     name TEXT,
+                     applied_at TEXT)''')
+    current = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        try:
+            migration(c)
+            c.execute('INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)',
+                      (version, migration.__name__.lstrip('_'), datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')))
+        except BaseException:
+            c.execute('ROLLBACK')
+            raise
+        c.execute('COMMIT')
+        print(f'Applied migration {version}: {migration.__name__.lstrip("_")}')
+        current = version
+    return current
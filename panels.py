@@ -0,0 +1,38 @@
+import asyncio
+
+import discord
+
+
+class PanelResetDebouncer:
+    """Clears the exchange panel's select at most once per ``delay`` per panel message.
+
+    Every click inside the window shares the edit already scheduled for that
+    message, so a busy panel costs one edit per window instead of one per click.
+    """
+
+    def __init__(self, delay=3.0):
+        self.delay = delay
+        self.edits = 0
+        self.edits_saved = 0
+        self._pending = {}
+
+    def request(self, message, view):
+        if message.id in self._pending:
+            self.edits_saved += 1
+            return
+        self._pending[message.id] = asyncio.create_task(self._reset(message, view))
+
+    def pending_count(self):
+        return len(self._pending)
+
+    async def _reset(self, message, view):
+        await asyncio.sleep(self.delay)
+        # Clicks that land while the edit is in flight need a reset of their own.
+        self._pending.pop(message.id, None)
+        try:
+            await message.edit(view=view)
+            self.edits += 1
+        except discord.NotFound:
+            pass
+        except (discord.HTTPException, discord.RateLimited) as e:
+            print(f'Failed to reset panel {message.id}: {e}')
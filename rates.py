@@ -0,0 +1,57 @@
+class RatesCache:
+    """Process-wide copy of the rates table per guild, written through by /setrates.
+
+    `version` increases on every change so holders of an older snapshot can
+    tell that the rates moved underneath them.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.rates = {}
+        self.version = 0
+        self._summaries = {}
+
+    def hydrate(self, conn):
+        self.replace(self.load(conn))
+
+    def load(self, conn):
+        return conn.execute('SELECT guild_id, type, rate FROM rates').fetchall()
+
+    def replace(self, rows):
+        rates = {}
+        for guild_id, ex_type, rate in rows:
+            rates.setdefault(guild_id, {})[ex_type] = rate
+        self.rates = rates
+        self._summaries = {}
+        self.version += 1
+
+    def get(self, guild_id, exchange_type, default=None):
+        return self.rates.get(guild_id, {}).get(exchange_type, default)
+
+    def inr_rates(self, guild_id):
+        return self._summary(guild_id)[0]
+
+    def npr_rates(self, guild_id):
+        return self._summary(guild_id)[1]
+
+    async def update(self, guild_id, new_rates):
+        changed = [(guild_id, ex_type, rate) for ex_type, rate in new_rates.items() if rate is not None]
+        await self.db.executemany('''INSERT INTO rates (guild_id, type, rate) VALUES (?, ?, ?)
+                                     ON CONFLICT (guild_id, type) DO UPDATE SET rate = excluded.rate''', changed)
+        self._apply(guild_id, {ex_type: rate for _, ex_type, rate in changed})
+        return [(rate, ex_type) for _, ex_type, rate in changed]
+
+    def _summary(self, guild_id):
+        summary = self._summaries.get(guild_id)
+        if summary is None:
+            rates = self.rates.get(guild_id, {})
+            summary = self._summaries[guild_id] = (
+                f"> **I2C:** {rates.get('I2C', 'N/A')}/$\n> **C2I:** {rates.get('C2I', 'N/A')}/$",
+                f"> **N2C:** {rates.get('N2C', 'N/A')}/$\n> **C2N:** {rates.get('C2N', 'N/A')}/$"
+            )
+        return summary
+
+    def _apply(self, guild_id, changes):
+        self.rates = {**self.rates, guild_id: {**self.rates.get(guild_id, {}), **changes}}
+        self.version += 1
+        self._summaries.pop(guild_id, None)
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from collections import deque
+
+import discord
+
+
+class RenameScheduler:
+    """Applies channel renames in the background within Discord's per-channel bucket.
+
+    Only the latest requested name per channel is kept, so claim/unclaim churn
+    collapses into at most one pending rename. A rename that hits a 429 stays
+    queued and is retried once the bucket frees up.
+    """
+
+    def __init__(self, limit=2, per=600.0):
+        self.limit = limit
+        self.per = per
+        self.applied = 0
+        self.superseded = 0
+        self.retries = 0
+        self._pending = {}
+        self._history = {}
+        self._blocked_until = {}
+        self._inflight = set()
+        self._tasks = set()
+        self._wakeup = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def desired_name(self, channel):
+        pending = self._pending.get(channel.id)
+        return pending[1] if pending else channel.name
+
+    def request(self, channel, name):
+        if channel.id in self._pending:
+            self.superseded += 1
+        if name == channel.name and channel.id not in self._inflight:
+            self._pending.pop(channel.id, None)
+            return
+        self._pending[channel.id] = (channel, name)
+        self._wake()
+
+    def cancel(self, channel_id):
+        self._pending.pop(channel_id, None)
+        self._history.pop(channel_id, None)
+        self._blocked_until.pop(channel_id, None)
+
+    def record(self, channel_id):
+        # Renames made outside the scheduler still use up the channel's bucket.
+        self._history.setdefault(channel_id, deque()).append(time.monotonic())
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _ready_at(self, channel_id, now):
+        ready = self._blocked_until.get(channel_id, 0.0)
+        history = self._history.get(channel_id)
+        if history:
+            while history and history[0] <= now - self.per:
+                history.popleft()
+            if len(history) >= self.limit:
+                ready = max(ready, history[0] + self.per)
+        return ready
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            next_due = None
+            for channel_id in list(self._pending):
+                if channel_id in self._inflight:
+                    continue
+                ready = self._ready_at(channel_id, now)
+                if ready <= now:
+                    channel, name = self._pending.pop(channel_id)
+                    self._inflight.add(channel_id)
+                    # Held here: the loop only keeps weak references to running tasks.
+                    task = asyncio.create_task(self._apply(channel, name))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                elif next_due is None or ready < next_due:
+                    next_due = ready
+            self._wakeup.clear()
+            timeout = None if next_due is None else max(0.0, next_due - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _apply(self, channel, name):
+        try:
+            if channel.name != name:
+                self._history.setdefault(channel.id, deque()).append(time.monotonic())
+                await channel.edit(name=name)
+                self.applied += 1
+        except discord.NotFound:
+            self.cancel(channel.id)
+        except discord.RateLimited as e:
+            self._retry_later(channel, name, e.retry_after)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                retry_after = e.response.headers.get('Retry-After') if e.response is not None else None
+                self._retry_later(channel, name, float(retry_after) if retry_after else self.per)
+            else:
+                print(f'Failed to rename #{channel.name} to {name}: {e}')
+        finally:
+            self._inflight.discard(channel.id)
+            self._wake()
+
+    def _retry_later(self, channel, name, retry_after):
+        self.retries += 1
+        self._blocked_until[channel.id] = time.monotonic() + retry_after
+        # A newer request made while this one was in flight wins.
+        self._pending.setdefault(channel.id, (channel, name))
@@ -0,0 +1,19 @@
+async def reconcile_roles(member, add=(), remove=(), reason=None):
+    """Apply every role change for ``member`` in a single ``member.edit`` call.
+
+    ``None`` entries are ignored so callers can pass lookups that may miss.
+    Returns False without touching the API when the member already has the
+    target role set.
+    """
+    # The role list is replaced wholesale, so it has to start from the member the
+    # gateway keeps current; any other copy (TTL-cached, from an old interaction)
+    # may miss roles gained since and would silently strip them. Only members the
+    # gateway cache does not hold cost a fetch.
+    cached = member.guild.get_member(member.id)
+    member = cached if cached is not None else await member.guild.fetch_member(member.id)
+    current = set(member.roles)
+    target = (current - {role for role in remove if role}) | {role for role in add if role}
+    if target == current:
+        return False
+    await member.edit(roles=[role for role in target if not role.is_default()], reason=reason)
+    return True
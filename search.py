@@ -0,0 +1,49 @@
+import html
+import re
+
+_HIDDEN_BLOCKS = re.compile(r'<(script|style)\b.*?</\1>', re.S | re.I)
+_TAGS = re.compile(r'<[^>]+>')
+_WHITESPACE = re.compile(r'\s+')
+_TERMS = re.compile(r'\w+')
+
+
+def index_trade(c, guild_id, trade_id, client_id, exchanger_id, exchange_type, amount_usd, crypto, date):
+    c.execute('''INSERT INTO search_index (guild_id, kind, ref_id, date, people, exchange_type, crypto, amount, title, body)
+                 VALUES (?, 'trade', ?, ?, ?, ?, ?, ?, '', '')''',
+              (guild_id, trade_id, date, f'{client_id} {exchanger_id}', exchange_type, crypto or '', f'{amount_usd:.2f}'))
+
+
+def index_transcript(c, guild_id, transcript_id, client_id, exchanger_id, channel_name, text, date):
+    people = ' '.join(str(user_id) for user_id in (client_id, exchanger_id) if user_id)
+    c.execute('''INSERT INTO search_index (guild_id, kind, ref_id, date, people, exchange_type, crypto, amount, title, body)
+                 VALUES (?, 'transcript', ?, ?, ?, '', '', '', ?, ?)''',
+              (guild_id, transcript_id, date, people, channel_name, text))
+
+
+def transcript_text(data):
+    text = _TAGS.sub(' ', _HIDDEN_BLOCKS.sub(' ', data.decode(errors='replace')))
+    return _WHITESPACE.sub(' ', html.unescape(text)).strip()
+
+
+def fts_query(text):
+    # Every word is quoted so user input can never be parsed as FTS5 syntax;
+    # a trailing * keeps prefix search ("usd*") working.
+    terms = []
+    for match in _TERMS.finditer(text):
+        prefix = match.end() < len(text) and text[match.end()] == '*'
+        terms.append(f'"{match.group()}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def search(c, guild_id, query, limit=10, offset=0):
+    match = fts_query(query)
+    if not match:
+        return []
+    c.execute('''SELECT s.kind, s.ref_id, s.date, s.people, s.exchange_type, s.crypto, s.amount, s.title, s.snippet, t.message_url
+                 FROM (SELECT kind, ref_id, date, people, exchange_type, crypto, amount, title,
+                              snippet(search_index, 9, '**', '**', '…', 12) AS snippet, rank
+                       FROM search_index WHERE search_index MATCH ? AND guild_id = ? ORDER BY rank LIMIT ? OFFSET ?) s
+                 LEFT JOIN transcripts t ON s.kind = 'transcript' AND t.id = s.ref_id
+                 ORDER BY s.rank''',
+              (match, guild_id, limit, offset))
+    return c.fetchall()
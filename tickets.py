@@ -0,0 +1,130 @@
+import asyncio
+
+
+TICKET_COLUMNS = ('channel_id', 'client_id', 'exchanger_id', 'exchange_type', 'claim_time', 'amount_usd', 'amount_local', 'crypto', 'rate', 'guild_id')
+
+
+class ActiveTicket:
+    __slots__ = TICKET_COLUMNS
+
+    def __init__(self, channel_id, client_id, exchanger_id=None, exchange_type=None, claim_time=None,
+                 amount_usd=None, amount_local=None, crypto=None, rate=None, guild_id=0):
+        self.channel_id = channel_id
+        self.client_id = client_id
+        self.exchanger_id = exchanger_id
+        self.exchange_type = exchange_type
+        self.claim_time = claim_time
+        self.amount_usd = amount_usd
+        self.amount_local = amount_local
+        self.crypto = crypto
+        self.rate = rate
+        self.guild_id = guild_id
+
+    def values(self):
+        return tuple(getattr(self, column) for column in TICKET_COLUMNS)
+
+
+class ActiveTicketRegistry:
+    """In-memory mirror of active_tickets, indexed by channel, (guild, client) and (guild, exchanger).
+
+    Every mutation is written to SQLite first and only applied in memory once
+    the write succeeds, so the unique indexes on active_tickets stay the final
+    word on "one ticket per client" and "one claim per exchanger".
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._by_channel = {}
+        self._by_client = {}
+        self._by_exchanger = {}
+        self._locks = {}
+
+    def hydrate(self, conn):
+        self.replace(self.load(conn))
+
+    def load(self, conn):
+        return conn.execute(f'SELECT {", ".join(TICKET_COLUMNS)} FROM active_tickets').fetchall()
+
+    def replace(self, rows):
+        # Built aside and swapped in, so readers never see a half-filled registry.
+        tickets = [ActiveTicket(*row) for row in rows]
+        self._by_channel = {ticket.channel_id: ticket for ticket in tickets}
+        self._by_client = {(ticket.guild_id, ticket.client_id): ticket for ticket in tickets}
+        self._by_exchanger = {(ticket.guild_id, ticket.exchanger_id): ticket for ticket in tickets if ticket.exchanger_id}
+
+    def __len__(self):
+        return len(self._by_channel)
+
+    def __iter__(self):
+        return iter(list(self._by_channel.values()))
+
+    def by_channel(self, channel_id):
+        return self._by_channel.get(channel_id)
+
+    def by_client(self, guild_id, client_id):
+        return self._by_client.get((guild_id, client_id))
+
+    def by_exchanger(self, guild_id, exchanger_id):
+        return self._by_exchanger.get((guild_id, exchanger_id))
+
+    async def create(self, ticket):
+        await self.db.execute(f'INSERT INTO active_tickets ({", ".join(TICKET_COLUMNS)}) VALUES ({", ".join("?" * len(TICKET_COLUMNS))})',
+                              ticket.values())
+        self._add(ticket)
+        return ticket
+
+    def lock(self, channel_id):
+        lock = self._locks.get(channel_id)
+        if lock is None:
+            lock = self._locks[channel_id] = asyncio.Lock()
+        return lock
+
+    async def claim(self, channel_id, exchanger_id, claim_time):
+        # Returns None to every claimer but the one whose compare-and-set landed.
+        async with self.lock(channel_id):
+            ticket = self._by_channel.get(channel_id)
+            if ticket is None or ticket.exchanger_id:
+                return None
+            updated = await self.db.execute('UPDATE active_tickets SET exchanger_id = ?, claim_time = ? WHERE channel_id = ? AND exchanger_id IS NULL',
+                                            (exchanger_id, claim_time, channel_id))
+            if not updated:
+                return None
+            self._set_exchanger(ticket, exchanger_id, claim_time)
+            return ticket
+
+    async def unclaim(self, channel_id):
+        async with self.lock(channel_id):
+            await self.db.execute('UPDATE active_tickets SET exchanger_id = ?, claim_time = ? WHERE channel_id = ?',
+                                  (None, None, channel_id))
+            ticket = self._by_channel.get(channel_id)
+            if ticket:
+                self._set_exchanger(ticket, None, None)
+            return ticket
+
+    async def remove(self, channel_id):
+        await self.db.execute('DELETE FROM active_tickets WHERE channel_id = ?', (channel_id,))
+        return self.discard(channel_id)
+
+    def discard(self, channel_id):
+        self._locks.pop(channel_id, None)
+        ticket = self._by_channel.pop(channel_id, None)
+        if ticket:
+            if self._by_client.get((ticket.guild_id, ticket.client_id)) is ticket:
+                del self._by_client[(ticket.guild_id, ticket.client_id)]
+            if ticket.exchanger_id and self._by_exchanger.get((ticket.guild_id, ticket.exchanger_id)) is ticket:
+                del self._by_exchanger[(ticket.guild_id, ticket.exchanger_id)]
+        return ticket
+
+    def _add(self, ticket):
+        self._by_channel[ticket.channel_id] = ticket
+        self._by_client[(ticket.guild_id, ticket.client_id)] = ticket
+        if ticket.exchanger_id:
+            self._by_exchanger[(ticket.guild_id, ticket.exchanger_id)] = ticket
+
+    def _set_exchanger(self, ticket, exchanger_id, claim_time):
+        if ticket.exchanger_id and self._by_exchanger.get((ticket.guild_id, ticket.exchanger_id)) is ticket:
+            del self._by_exchanger[(ticket.guild_id, ticket.exchanger_id)]
+        ticket.exchanger_id = exchanger_id
+        ticket.claim_time = claim_time
+        if exchanger_id:
+            self._by_exchanger[(ticket.guild_id, exchanger_id)] = ticket
@@ -0,0 +1,48 @@
+import asyncio
+import os
+import resource
+import time
+
+from tracing import span
+
+
+class StepTimer:
+    """Times named steps of a command, including steps that run concurrently."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.steps = {}
+        self.errors = {}
+
+    async def step(self, name, coro):
+        started = time.perf_counter()
+        try:
+            with span(name):
+                return await coro
+        except Exception as e:
+            self.errors[name] = e
+            raise
+        finally:
+            self.steps[name] = time.perf_counter() - started
+
+    async def gather(self, **branches):
+        # One failing branch must not cancel the others; failures are kept in self.errors.
+        results = await asyncio.gather(*(self.step(name, coro) for name, coro in branches.items()), return_exceptions=True)
+        return dict(zip(branches, results))
+
+    def report(self):
+        total = (time.perf_counter() - self.started) * 1000
+        breakdown = ', '.join(f'{name}={elapsed * 1000:.1f}ms' for name, elapsed in self.steps.items())
+        print(f'{self.name} took {total:.1f}ms ({breakdown})')
+        for name, error in self.errors.items():
+            print(f'{self.name} step {name} failed: {error!r}')
+
+
+def resident_memory_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except OSError:
+        # No procfs (macOS): fall back to the peak, which ru_maxrss reports in bytes there.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 / 1024
@@ -0,0 +1,182 @@
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import time
+from datetime import datetime, timezone
+
+MAX_CHILDREN = 200
+_TOKEN = re.compile(r'/(webhooks|interactions)/(\d+)/[^/]+')
+_current = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    __slots__ = ('name', 'attrs', 'started', 'elapsed', 'error', 'children', 'dropped')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.error = None
+        self.children = []
+        self.dropped = 0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self, error=None):
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self.started
+        if error is not None and self.error is None:
+            self.error = repr(error)
+
+    def to_dict(self, origin):
+        data = {'name': self.name, 'start_ms': round((self.started - origin) * 1000, 2),
+                'ms': None if self.elapsed is None else round(self.elapsed * 1000, 2)}
+        if self.attrs:
+            data['attrs'] = self.attrs
+        if self.error:
+            data['error'] = self.error
+        if self.children:
+            data['children'] = [child.to_dict(origin) for child in self.children]
+        if self.dropped:
+            data['dropped'] = self.dropped
+        return data
+
+
+class _NullSpan:
+    def set(self, **attrs):
+        pass
+
+    def finish(self, error=None):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+def _child(name, attrs):
+    parent = _current.get()
+    # Tasks spawned by a handler inherit its span; once that span has finished
+    # (and possibly been logged) their work no longer belongs to it.
+    if parent is None or parent.elapsed is not None:
+        return None
+    if len(parent.children) >= MAX_CHILDREN:
+        parent.dropped += 1
+        return None
+    child = Span(name, attrs)
+    parent.children.append(child)
+    return child
+
+
+def start_span(name, **attrs):
+    """Leaf span for work that starts and ends in separate callbacks; call finish() on it."""
+    return _child(name, attrs) or NULL_SPAN
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    child = _child(name, attrs)
+    if child is None:
+        yield NULL_SPAN
+        return
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.finish(e)
+        raise
+    finally:
+        child.finish()
+        _current.reset(token)
+
+
+def current_span():
+    return _current.get() or NULL_SPAN
+
+
+class Tracer:
+    """Builds a span tree per interaction and logs the slow ones as JSON lines.
+
+    `begin` opens the root span for the current task and closes it when the
+    task finishes. Only `sample_rate` of interactions are traced at all, so the
+    rest cost one random() call. The log rotates at `max_bytes` and is written
+    from a QueueListener thread, never from the event loop.
+    """
+
+    def __init__(self, path='slow_interactions.jsonl', threshold_ms=3000, sample_rate=1.0, max_bytes=5 * 1024 * 1024, backups=5):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.traced = 0
+        self.slow = 0
+        self.logger = logging.getLogger('exchange_bot.slow_interactions')
+        self.logger.propagate = False
+        self._listener = None
+
+    def start(self):
+        if self._listener is not None:
+            return
+        records = queue.SimpleQueue()
+        handler = logging.handlers.RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups,
+                                                       encoding='utf-8', delay=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self._listener = logging.handlers.QueueListener(records, handler)
+        self._listener.start()
+        self.logger.addHandler(logging.handlers.QueueHandler(records))
+        self.logger.setLevel(logging.INFO)
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def begin(self, name, **attrs):
+        if random.random() >= self.sample_rate:
+            _current.set(None)
+            return NULL_SPAN
+        root = Span(name, attrs)
+        _current.set(root)
+        task = asyncio.current_task()
+        if task is not None:
+            task.add_done_callback(lambda _: self.end(root))
+        return root
+
+    def end(self, root):
+        if root.elapsed is not None:
+            return
+        root.finish()
+        self.traced += 1
+        if root.elapsed * 1000 < self.threshold_ms:
+            return
+        self.slow += 1
+        entry = {'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'), **root.to_dict(root.started)}
+        self.logger.info(json.dumps(entry, default=str))
+
+
+def trace_requests(trace):
+    """Adds a span per Discord REST call (including rate-limit retries) to an aiohttp TraceConfig."""
+
+    async def on_request_start(session, ctx, params):
+        # Interaction and webhook tokens are credentials; keep them out of the log.
+        ctx.span = start_span('http', method=params.method, path=_TOKEN.sub(r'/\1/\2/{token}', params.url.path))
+
+    async def on_request_end(session, ctx, params):
+        ctx.span.set(status=params.response.status)
+        ctx.span.finish()
+
+    async def on_request_exception(session, ctx, params):
+        ctx.span.finish(params.exception)
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    return trace
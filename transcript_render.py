@@ -0,0 +1,138 @@
+import asyncio
+import html
+import io
+import multiprocessing
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+async def collect_messages(channel):
+    # Each message is pickled as it arrives and the frames are concatenated, so
+    # handing the transcript to a worker is one bytes copy instead of one large
+    # pickle that would hold the event loop.
+    frames = []
+    count = 0
+    async for message in channel.history(limit=None, oldest_first=True):
+        author = message.author
+        count += 1
+        frames.append(pickle.dumps((
+            author.display_name,
+            author.display_avatar.url,
+            author.bot,
+            message.created_at.strftime('%Y-%m-%d %H:%M:%S UTC'),
+            message.content,
+            tuple((a.filename, a.url) for a in message.attachments),
+            tuple((e.title or '', e.description or '', tuple((f.name, f.value) for f in e.fields)) for e in message.embeds)
+        ), pickle.HIGHEST_PROTOCOL))
+    return count, b''.join(frames)
+
+
+def iter_messages(count, blob):
+    stream = io.BytesIO(blob)
+    for _ in range(count):
+        yield pickle.load(stream)
+
+
+def render_html(guild_name, channel_name, count, blob, timeout=None):
+    # The deadline is checked inside the worker so a runaway transcript fails
+    # on its own instead of the parent tearing down a pool other jobs share.
+    deadline = time.monotonic() + timeout if timeout else None
+    esc = html.escape
+    parts = [
+        '<!DOCTYPE html><html><head><meta charset="utf-8">',
+        f'<title>{esc(channel_name)}</title>',
+        '<style>body{background:#313338;color:#dbdee1;font-family:sans-serif;margin:0;padding:16px}'
+        '.m{display:flex;gap:12px;padding:6px 0}.m img.a{width:40px;height:40px;border-radius:50%}'
+        '.n{font-weight:600;color:#f2f3f5}.t{color:#949ba4;font-size:12px;margin-left:6px}'
+        '.b{background:#5865f2;color:#fff;font-size:10px;padding:1px 4px;border-radius:3px;margin-left:4px}'
+        '.c{white-space:pre-wrap;word-wrap:break-word}'
+        '.e{border-left:4px solid #1e1f22;background:#2b2d31;padding:8px 12px;margin-top:4px;border-radius:4px}'
+        '.f{margin-top:4px}.fn{font-weight:600}</style></head><body>',
+        f'<h2>{esc(guild_name)} / #{esc(channel_name)}</h2><p>{count} messages</p>'
+    ]
+    for index, (name, avatar, is_bot, created_at, content, attachments, embeds) in enumerate(iter_messages(count, blob)):
+        if deadline and index % 256 == 0 and time.monotonic() > deadline:
+            raise TimeoutError(f'rendering took longer than {timeout:.0f}s ({index}/{count} messages)')
+        parts.append(f'<div class="m"><img class="a" src="{esc(avatar)}"><div>')
+        parts.append(f'<span class="n">{esc(name)}</span>')
+        if is_bot:
+            parts.append('<span class="b">BOT</span>')
+        parts.append(f'<span class="t">{created_at}</span>')
+        if content:
+            parts.append(f'<div class="c">{esc(content)}</div>')
+        for filename, url in attachments:
+            parts.append(f'<div><a href="{esc(url)}">{esc(filename)}</a></div>')
+        for title, description, fields in embeds:
+            parts.append('<div class="e">')
+            if title:
+                parts.append(f'<div class="n">{esc(title)}</div>')
+            if description:
+                parts.append(f'<div class="c">{esc(description)}</div>')
+            for field_name, field_value in fields:
+                parts.append(f'<div class="f"><div class="fn">{esc(field_name)}</div><div class="c">{esc(field_value)}</div></div>')
+            parts.append('</div>')
+        parts.append('</div></div>')
+    parts.append('</body></html>')
+    # Returned encoded: bytes come back through the result pipe far cheaper than a str.
+    return ''.join(parts).encode()
+
+
+class ProcessTranscriptRenderer:
+    """Collects a channel's messages on the event loop and builds the HTML in a worker process.
+
+    Drop-in replacement for ``chat_exporter.export`` as the pipeline's render
+    callable, except that it returns the HTML already encoded. A render that
+    exceeds ``timeout`` seconds raises TimeoutError without affecting other
+    jobs in the pool. A pool that broke (a worker was killed) or has a worker
+    that stopped answering is retired, and the next render starts a new one.
+    """
+
+    def __init__(self, workers=2, timeout=60.0, grace=30.0):
+        self.workers = workers
+        self.timeout = timeout
+        self.grace = grace
+        self.rendered = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self._pool = None
+
+    def start(self):
+        if self._pool is None:
+            # Spawned, not forked: the bot already runs several threads (sqlite,
+            # aiohttp, the slow-log listener) and forking those can deadlock.
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def __call__(self, channel):
+        count, blob = await collect_messages(channel)
+        self.start()
+        pool = self._pool
+        future = asyncio.get_running_loop().run_in_executor(pool, render_html, channel.guild.name, channel.name, count, blob,
+                                                           self.timeout)
+        try:
+            # The worker enforces the timeout itself; this only fires if it stops responding altogether.
+            data = await asyncio.wait_for(future, self.timeout + self.grace)
+        except BrokenProcessPool:
+            self._retire(pool)
+            raise
+        except (TimeoutError, asyncio.TimeoutError):
+            self.timeouts += 1
+            if future.cancelled():
+                self._retire(pool)
+                raise TimeoutError(f'render worker did not respond within {self.timeout + self.grace:.0f}s') from None
+            raise
+        self.rendered += 1
+        return data
+
+    def _retire(self, pool):
+        # Jobs already running elsewhere in the old pool still finish; new ones go to a fresh pool.
+        if self._pool is pool:
+            self._pool = None
+            self.restarts += 1
+        pool.shutdown(wait=False)
@@ -0,0 +1,160 @@
+import asyncio
+import gzip
+import hashlib
+import os
+from datetime import datetime
+
+import discord
+import pytz
+
+from search import index_transcript, transcript_text
+
+
+class TranscriptJob:
+    __slots__ = ('channel', 'closed_by', 'client_id', 'exchanger_id')
+
+    def __init__(self, channel, closed_by, client_id=None, exchanger_id=None):
+        self.channel = channel
+        self.closed_by = closed_by
+        self.client_id = client_id
+        self.exchanger_id = exchanger_id
+
+
+class TranscriptRecord:
+    __slots__ = ('id', 'sha256', 'channel_name', 'closed_at', 'data')
+
+    def __init__(self, id, sha256, channel_name, closed_at, data):
+        self.id = id
+        self.sha256 = sha256
+        self.channel_name = channel_name
+        self.closed_at = closed_at
+        self.data = data
+
+
+class TranscriptArchive:
+    """Gzip-compressed, content-addressed transcript store indexed in the transcripts table."""
+
+    def __init__(self, db, root='transcripts'):
+        self.db = db
+        self.root = root
+
+    def path(self, sha256):
+        return os.path.join(self.root, sha256[:2], f'{sha256}.html.gz')
+
+    def _write(self, data):
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.path(sha256)
+        if os.path.exists(path):
+            return sha256, os.path.getsize(path)
+        directory = os.path.dirname(path)
+        created = not os.path.isdir(directory)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(gzip.compress(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        # The rename (and a freshly created shard directory) is only durable once the directory entries are.
+        _fsync_dir(directory)
+        if created:
+            _fsync_dir(self.root)
+        return sha256, os.path.getsize(path)
+
+    async def store(self, job, data):
+        loop = asyncio.get_running_loop()
+        sha256, compressed_size = await loop.run_in_executor(None, self._write, data)
+        text = await loop.run_in_executor(None, transcript_text, data)
+        ist = pytz.timezone('Asia/Kolkata')
+        closed_at = datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S')
+
+        def add_transcript(c):
+            c.execute('''INSERT INTO transcripts (guild_id, channel_id, channel_name, client_id, exchanger_id, closed_by, sha256, size, compressed_size, date)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                      (job.channel.guild.id, job.channel.id, job.channel.name, job.client_id, job.exchanger_id, job.closed_by.id,
+                       sha256, len(data), compressed_size, closed_at))
+            transcript_id = c.lastrowid
+            index_transcript(c, job.channel.guild.id, transcript_id, job.client_id, job.exchanger_id, job.channel.name, text, closed_at)
+            return transcript_id
+        transcript_id = await self.db.write(add_transcript)
+        return TranscriptRecord(transcript_id, sha256, job.channel.name, closed_at, data)
+
+
+def _fsync_dir(path):
+    # Directories cannot be opened for fsync on Windows; NTFS journals the rename itself.
+    if os.name != 'posix':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class TranscriptPipeline:
+    """Background queue that renders, archives, deletes and publishes closed tickets.
+
+    The ticket channel is deleted only once the transcript file is fsynced and
+    its row is committed. If rendering or archiving fails the channel is kept
+    so the close can be retried. Publishing (the single upload and the DMs) happens
+    afterwards and never holds up the close command.
+    """
+
+    def __init__(self, archive, render, publish, workers=2):
+        self.archive = archive
+        self.render = render
+        self.publish = publish
+        self.workers = workers
+        self._queue = None
+        self._tasks = []
+        self._channels = set()
+
+    def start(self):
+        if not self._tasks:
+            self._queue = asyncio.Queue()
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        # Jobs still queued keep their channels, so their tickets can simply be closed again.
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job):
+        """Queue ``job``; returns False if its channel is already queued or being processed."""
+        if job.channel.id in self._channels:
+            return False
+        self._channels.add(job.channel.id)
+        self._queue.put_nowait(job)
+        return True
+
+    def backlog(self):
+        return self._queue.qsize() if self._queue else 0
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            except Exception as e:
+                print(f'Transcript job for #{job.channel.name} failed: {e!r}')
+            finally:
+                self._channels.discard(job.channel.id)
+                self._queue.task_done()
+
+    async def _process(self, job):
+        try:
+            html = await self.render(job.channel)
+            if not html:
+                raise ValueError('the transcript came back empty')
+            record = await self.archive.store(job, html if isinstance(html, bytes) else html.encode())
+        except Exception as e:
+            # Without an archived transcript the channel is the only copy of the ticket, so it stays.
+            await job.channel.send(f"⚠️ Error creating transcript: {str(e)}\nThe channel was kept; use `.close` again to retry.")
+            return
+        try:
+            await job.channel.delete()
+        except discord.NotFound:
+            pass
+        await self.publish(job, record)